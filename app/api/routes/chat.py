@@ -115,8 +115,8 @@ async def chat_endpoint(
             response=response_text,
             user_id=request.user_id,
             conversation_id=conversation.conversation_id,
-            action=action_data.get("action") if action_data else None,
-            params=action_data.get("params") if action_data else None
+            action=action_data.action if action_data else None,
+            params=action_data.params if action_data else None
         )
         
         logger.info(f"✅ Respuesta generada exitosamente para {request.user_id}")
@@ -18,6 +18,7 @@ Niveles de log:
 - CRITICAL: Error muy grave, la aplicación podría detenerse
 """
 
+import functools
 import logging
 import sys
 from pathlib import Path
@@ -135,3 +136,32 @@ def get_logger(name: str) -> logging.Logger:
         Logger configurado
     """
     return logging.getLogger(name)
+
+
+def log_enter_exit(name: str):
+    """
+    Decorador para handlers async que registra una vez la entrada y la salida.
+    
+    Reemplaza los banners "=====Inicio/Fin=====" repetidos en cada return
+    temprano: la salida se registra en el finally, sea cual sea el camino.
+    
+    Args:
+        name: Nombre del handler a mostrar en el log
+    
+    Returns:
+        Decorador
+    """
+    def decorator(fn):
+        fn_logger = logging.getLogger(fn.__module__)
+        
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            fn_logger.info("===== Inicio %s =====", name)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                fn_logger.info("===== Fin %s =====", name)
+        
+        return wrapper
+    
+    return decorator
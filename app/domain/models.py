@@ -113,6 +113,18 @@ class Conversation:
 
     state: ConversationState = ConversationState.IDLE
     state_data: dict = field(default_factory=dict)
+
+    # Cambios pendientes de persistir (una conversación nueva aún no está guardada)
+    _dirty: bool = field(default=True, repr=False, compare=False)
+    
+    @property
+    def is_dirty(self) -> bool:
+        """Indica si hay cambios que todavía no se guardaron."""
+        return self._dirty
+    
+    def mark_clean(self) -> None:
+        """Marca la conversación como sincronizada con el almacenamiento."""
+        self._dirty = False
     
     def add_message(self, role: MessageRole, content: str) -> Message:
         """
@@ -128,6 +140,7 @@ class Conversation:
         message = Message(role=role, content=content)
         self.messages.append(message)
         self.updated_at = datetime.now()
+        self._dirty = True
         return message
     
     def get_recent_messages(self, limit: int = 10) -> List[Message]:
@@ -146,6 +159,7 @@ class Conversation:
         """Cierra la conversación"""
         self.status = ConversationStatus.CLOSED
         self.updated_at = datetime.now()
+        self._dirty = True
 
     def set_state(self, state: ConversationState, **data):
         """
@@ -160,11 +174,24 @@ class Conversation:
         if data:
             self.state_data.update(data)
         self.updated_at = datetime.now()
+        self._dirty = True
+
+    def update_state_data(self, **patch):
+        """
+        Actualiza los datos del estado en el mismo dict, sin cambiar el estado.
+
+        Args:
+            **patch: Claves a fusionar en state_data
+        """
+        self.state_data.update(patch)
+        self.updated_at = datetime.now()
+        self._dirty = True
 
     def clear_state(self):
         """Limpia el estado actual."""
         self.state = ConversationState.IDLE
         self.state_data = {}
+        self._dirty = True
 
     def is_in_flow(self) -> bool:
         """Verifica si hay un flujo activo."""
@@ -277,3 +304,26 @@ class ActionIntent:
             True si la confianza es suficiente
         """
         return self.confidence >= threshold
+
+
+@dataclass(slots=True, frozen=True)
+class ActionData:
+    """
+    Resultado de una acción ejecutada por un handler del flujo.
+    
+    Inmutable, por lo que los resultados frecuentes (ej: "en progreso")
+    se pueden compartir como instancias únicas sin crear un dict por turno.
+    """
+    action: str
+    status: Optional[str] = None
+    cita: Optional[dict] = None
+    
+    @property
+    def params(self) -> Optional[dict]:
+        """Parámetros de la acción para la respuesta de la API."""
+        params = {}
+        if self.status is not None:
+            params["status"] = self.status
+        if self.cita is not None:
+            params["cita"] = self.cita
+        return params or None
@@ -38,9 +38,34 @@ class SeguimientoClient:
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = 10.0  # Timeout de 10 segundos
+        # Cliente HTTP compartido (keep-alive) entre todas las peticiones
+        self._client: Optional[httpx.AsyncClient] = None
         
         logger.info(f"SeguimientoClient inicializado: {self.base_url}")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Obtiene el cliente HTTP compartido, creándolo si es necesario.
+        
+        Reutilizar el cliente mantiene las conexiones abiertas (pool
+        keep-alive) y evita un handshake TCP por cada petición.
+        
+        Returns:
+            Cliente httpx asíncrono
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=32)
+            )
+        return self._client
+    
+    async def close(self) -> None:
+        """Cierra el pool de conexiones HTTP."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
     async def _request(
         self,
         method: str,
@@ -61,34 +86,34 @@ class SeguimientoClient:
         url = f"{self.base_url}{endpoint}"
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.request(method, url, **kwargs)
-                response.raise_for_status()
-                
-                json_response = response.json()
-                logger.info(f"📥 Respuesta raw del backend: {json_response}")
+            client = self._get_client()
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            
+            json_response = response.json()
+            logger.info(f"📥 Respuesta raw del backend: {json_response}")
 
-                if isinstance(json_response, dict):
-                    status = json_response.get("statusCode")
-                    data = json_response.get("data")
+            if isinstance(json_response, dict):
+                status = json_response.get("statusCode")
+                data = json_response.get("data")
 
-                    if status == 500:
-                        logger.error(f"❌ Error 500 desde Seguimiento: {data}")
-                        return None
-                    
-                    # ✅ FIX: Si tiene la estructura esperada, retornar data
-                    if data is not None:
-                        logger.info(f"✅ Retornando 'data' del response: {data}")
-                        return data
-                    
-                    # ✅ Si no tiene 'data', pero tiene statusCode 200/201, retornar todo
-                    if status in [200, 201]:
-                        logger.info(f"✅ Retornando response completo (sin 'data'): {json_response}")
-                        return json_response
+                if status == 500:
+                    logger.error(f"❌ Error 500 desde Seguimiento: {data}")
+                    return None
+                
+                # ✅ FIX: Si tiene la estructura esperada, retornar data
+                if data is not None:
+                    logger.info(f"✅ Retornando 'data' del response: {data}")
+                    return data
                 
-                # Si no es dict o no tiene la estructura esperada, retornar tal cual
-                logger.info(f"✅ Retornando response directo: {json_response}")
-                return json_response
+                # ✅ Si no tiene 'data', pero tiene statusCode 200/201, retornar todo
+                if status in [200, 201]:
+                    logger.info(f"✅ Retornando response completo (sin 'data'): {json_response}")
+                    return json_response
+            
+            # Si no es dict o no tiene la estructura esperada, retornar tal cual
+            logger.info(f"✅ Retornando response directo: {json_response}")
+            return json_response
                 
         except httpx.TimeoutException:
             logger.error(f"⏱️ Timeout al conectar con Seguimiento: {url}")
@@ -343,9 +368,9 @@ class SeguimientoClient:
         logger.debug("💓 Verificando salud del servicio Seguimiento")
         
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/api/health")
-                return response.status_code == 200
+            client = self._get_client()
+            response = await client.get(f"{self.base_url}/api/health", timeout=5.0)
+            return response.status_code == 200
         
         except Exception as e:
             logger.error(f"❌ Servicio Seguimiento no disponible: {e}")
@@ -371,3 +396,12 @@ def get_seguimiento_client() -> SeguimientoClient:
         _seguimiento_client = SeguimientoClient(base_url=seguimiento_url)
 
     return _seguimiento_client
+
+
+async def close_seguimiento_client() -> None:
+    """Cierra el pool HTTP del cliente Seguimiento global."""
+    global _seguimiento_client
+    
+    if _seguimiento_client:
+        await _seguimiento_client.close()
+        _seguimiento_client = None
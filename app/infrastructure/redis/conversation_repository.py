@@ -74,8 +74,12 @@ class ConversationRepository:
             ttl: Tiempo de vida en segundos (None usa el default)
         
         Returns:
-            True si se guardó exitosamente
+            True si se guardó exitosamente (o no había cambios que guardar)
         """
+        if not conversation.is_dirty:
+            logger.debug(f"💾 Sin cambios, se omite el guardado: {conversation.user_id}")
+            return True
+        
         try:
             key = self._get_key(conversation.user_id)
             expire_time = ttl or self.ttl
@@ -107,6 +111,8 @@ class ConversationRepository:
             success = self.redis.set(key, conversation_data, expire=expire_time)
             
             if success:
+                conversation.mark_clean()
+                
                 # Actualizar metadata
                 meta_key = self._get_meta_key(conversation.user_id)
                 meta_data = {
@@ -170,6 +176,7 @@ class ConversationRepository:
             from app.domain.models import ConversationState
             conversation.state = ConversationState(data.get("state", "idle"))
             conversation.state_data = data.get("state_data", {})
+            conversation.mark_clean()
             
             logger.debug(
                 f"📖 Conversación recuperada: {user_id} "
@@ -53,6 +53,7 @@ from app.core.logging import setup_logging, get_logger
 # Importaciones de infraestructura
 from app.infrastructure.ai.model_loader import ModelLoader
 from app.infrastructure.redis import get_redis_client, close_redis_client
+from app.infrastructure.http import close_seguimiento_client
 
 # Importaciones de servicios
 from app.services.ai_service import AIService
@@ -171,10 +172,17 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Error cerrando Redis: {e}")
     
-    # 2. Cerrar conexiones de DB
+    # 2. Cerrar pool HTTP hacia Seguimiento
+    try:
+        await close_seguimiento_client()
+        logger.info("✅ Cliente Seguimiento cerrado")
+    except Exception as e:
+        logger.error(f"❌ Error cerrando cliente Seguimiento: {e}")
+    
+    # 3. Cerrar conexiones de DB
     # db_engine.dispose()
     
-    # 3. Liberar memoria del modelo si es necesario
+    # 4. Liberar memoria del modelo si es necesario
     # ModelLoader.unload_model()  # Solo si necesitas liberar memoria
     
     logger.info("👋 Aplicación apagada correctamente")
@@ -18,6 +18,7 @@ Hace el código más testeable y reutilizable.
 from email.mime import message
 import re
 import json
+from datetime import datetime, timedelta
 from typing import List, Optional, Tuple
 from urllib import response
 from app.domain.models import ConversationState, Message, MessageRole, ActionIntent, Conversation
@@ -193,7 +194,6 @@ class AIService:
         """
 
         # Detectar fechas absurdas (dias > 31, meses > 12)
-        import re
         date_pattern = r'\d{2,}/\d{2,}/\d{2,}'
         dates = re.findall(date_pattern, response)
 
@@ -455,9 +455,6 @@ class AIService:
             dict con keys: fecha, hora, motivo
         """
 
-        import re
-        from datetime import datetime, timedelta
-
         extracted = {
             "fecha": None,
             "hora": None,
@@ -919,7 +916,6 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
         - Signos de interrogacion o exclamacion
         """ 
 
-        import re
         # Patrón: Punto/Interrogación/Exclamación + Espacio + Mayúscula
         pattern = r'(?<=[.!?])\s+(?=[A-ZÁÉÍÓÚÑ])'
         
@@ -13,10 +13,11 @@ Flujo:
 """
 
 from typing import Optional, Dict, Any, Tuple
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from app.domain.models import Conversation, ConversationState, Message, MessageRole
 from app.infrastructure.http import SeguimientoClient
 from app.core.logging import get_logger
+from app.utils.validators import MONTHS_ES, format_date_spanish
 
 logger = get_logger(__name__)
 
@@ -78,8 +79,7 @@ class AppointmentService:
                 )
             else:
                 # Actualizar state_data sin cambiar estado
-                conversation.state_data["extracted_data"] = final_data
-                conversation.updated_at = datetime.now()
+                conversation.update_state_data(extracted_data=final_data)
                 
             logger.info(f"Estado actualizado: {conversation.state.value}, Data: {conversation.state_data}")
             return mensaje, None
@@ -156,8 +156,8 @@ class AppointmentService:
             # Convertir fecha a formato legible
 
             try:
-                fecha_obj = datetime.strptime(fecha, "%Y-%m-%d")
-                fecha_legible = fecha_obj.strftime("%d de %B")
+                fecha_obj = date.fromisoformat(fecha)
+                fecha_legible = f"{fecha_obj.day:02d} de {MONTHS_ES[fecha_obj.month]}"
             except:
                 fecha_legible = fecha
 
@@ -196,8 +196,8 @@ class AppointmentService:
 
         try:
             # Validar fecha
-            fecha = datetime.strptime(fecha_str, "%Y-%m-%d")
-            hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            fecha = date.fromisoformat(fecha_str)
+            hoy = date.today()
             
             if fecha < hoy:
                 return False, "La fecha no puede ser en el pasado. Por favor elige otra fecha."
@@ -301,7 +301,7 @@ class AppointmentService:
             fecha_programada = cita.get("fecha_programada", "")
             fecha_obj = datetime.fromisoformat(fecha_programada.replace("Z", "+00:00"))
 
-            fecha_legible = fecha_obj.strftime("%d de %B de %Y")
+            fecha_legible = format_date_spanish(fecha_obj)
             hora_legible = fecha_obj.strftime("%H:%M")
 
             motivo = cita.get("motivo")
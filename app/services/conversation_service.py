@@ -13,13 +13,15 @@ Responsabilidades:
 Ahora usa Redis para persistencia temporal de conversaciones.
 """
 
+import asyncio
 from typing import Optional
 from datetime import datetime, timedelta
-from app.domain.models import Conversation, ConversationState, Message, MessageRole, ConversationStatus
+from app.domain.models import ActionData, Conversation, ConversationState, Message, MessageRole, ConversationStatus
 from app.domain.exceptions import ConversationNotFoundException
 from app.services.ai_service import AIService
 from app.infrastructure.redis import ConversationRepository
 from app.core.logging import get_logger
+from app.utils.validators import format_date_spanish
 from app.services.appointment_service import get_appointment_service
 from app.services.reschedule_handlers import RescheduleHandlers
 
@@ -53,7 +55,7 @@ class ConversationService:
         
         logger.info("✅ ConversationService inicializado con Redis")
     
-    def get_or_create_conversation(self, user_id: str) -> Conversation:
+    def get_or_create_conversation(self, user_id: str, persist: bool = True) -> Conversation:
         """
         Obtiene una conversación existente o crea una nueva.
         
@@ -61,6 +63,8 @@ class ConversationService:
         
         Args:
             user_id: ID del usuario (número de teléfono)
+            persist: Guardar de inmediato la conversación nueva (False si el
+                llamador la va a guardar al final del turno)
         
         Returns:
             Conversación del usuario
@@ -76,7 +80,8 @@ class ConversationService:
                 user_id=user_id
             )
             # Guardar en Redis
-            self.repo.save(conversation)
+            if persist:
+                self.repo.save(conversation)
             logger.info(f"📝 Nueva conversación creada en Redis: {conversation.conversation_id}")
         else:
             # Extender TTL si existe (usuario activo)
@@ -89,7 +94,8 @@ class ConversationService:
         self,
         user_id: str,
         role: MessageRole,
-        content: str
+        content: str,
+        conversation: Optional[Conversation] = None
     ) -> Message:
         """
         Añade un mensaje a una conversación.
@@ -98,23 +104,95 @@ class ConversationService:
             user_id: ID del usuario
             role: Rol del mensaje (user/assistant/system)
             content: Contenido del mensaje
+            conversation: Conversación ya cargada (evita releerla de Redis)
+        
+        Returns:
+            Mensaje creado
+        """
+        return self.add_messages(user_id, [(role, content)], conversation)[0]
+    
+    async def add_message_async(
+        self,
+        user_id: str,
+        role: MessageRole,
+        content: str,
+        conversation: Optional[Conversation] = None
+    ) -> Message:
+        """
+        Versión para handlers async de add_message().
+        
+        El cliente de Redis es síncrono: la escritura se ejecuta en un hilo
+        para no bloquear el event loop mientras dura el round trip.
+        
+        Args:
+            user_id: ID del usuario
+            role: Rol del mensaje (user/assistant/system)
+            content: Contenido del mensaje
+            conversation: Conversación ya cargada (evita releerla de Redis)
         
         Returns:
             Mensaje creado
         """
+        return await asyncio.to_thread(self.add_message, user_id, role, content, conversation)
+    
+    def add_messages(
+        self,
+        user_id: str,
+        messages: list[tuple[MessageRole, str]],
+        conversation: Optional[Conversation] = None
+    ) -> list[Message]:
+        """
+        Añade varios mensajes y los persiste con una sola escritura.
+        
+        Si se pasa la conversación en memoria, se guarda junto con su
+        estado actual, por lo que no hace falta un repo.save() previo.
+        
+        Args:
+            user_id: ID del usuario
+            messages: Lista de tuplas (rol, contenido)
+            conversation: Conversación ya cargada (evita releerla de Redis)
+        
+        Returns:
+            Mensajes creados
+        """
         # 1. Obtener conversacion existente (O crear si es primera vez)
-        conversation = self.get_or_create_conversation(user_id)
+        if conversation is None:
+            conversation = self.get_or_create_conversation(user_id)
+        
+        added = [
+            self._append_message(conversation, role, content)
+            for role, content in messages
+        ]
+
+        # Persistir en Redis (una sola escritura para todo el turno)
+        self.repo.save(conversation)
+        
+        return added
+    
+    def _append_message(
+        self,
+        conversation: Conversation,
+        role: MessageRole,
+        content: str
+    ) -> Message:
+        """
+        Limpia el contenido y lo agrega a la conversación en memoria, sin guardar.
+        
+        Args:
+            conversation: Conversación a modificar
+            role: Rol del mensaje (user/assistant/system)
+            content: Contenido del mensaje
         
-        # 2. Limpiar solo el contenido del nuevo mensaje
+        Returns:
+            Mensaje creado
+        """
+        # Limpiar solo el contenido del nuevo mensaje
         content_cleaned = self._clean_menssage_content(content)
 
-        # 3. Agregar mensaje limpio al historial existente
+        # Agregar mensaje limpio al historial existente
         message = conversation.add_message(role=role, content=content_cleaned)
-
-        # Persistir en Redis
-        self.repo.save(conversation)
         
-        logger.info(f"💬 Mensaje añadido a Redis: {role.value} | {content_cleaned}...")
+        logger.info(f"💬 Mensaje añadido: {role.value} | {content_cleaned}...")
         
         return message
     
@@ -245,8 +323,6 @@ class ConversationService:
         Returns:
             Número de conversaciones eliminadas
         """
-        from datetime import timedelta
-        
         cutoff_time = datetime.now() - timedelta(hours=hours)
         to_remove = []
         
@@ -299,7 +375,7 @@ class ConversationService:
         message_content: str,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None
-    ) -> tuple[str, Optional[dict]]:
+    ) -> tuple[str, Optional[ActionData]]:
         """
         Procesa un mensaje del usuario con CONTROL DE FLUJO
 
@@ -312,17 +388,42 @@ class ConversationService:
 
         logger.info(f"Procesando mensaje de usuario: {user_id}")
 
-        # 1. Añadir mensaje del usuario
-        self.add_message(
-            user_id=user_id,
-            role=MessageRole.USER,
-            content=message_content
-        )
+        # 1. Obtener conversacion (si es nueva se guarda al final del turno)
+        conversation = self.get_or_create_conversation(user_id, persist=False)
 
-        # 2. Obtener conversacion
-        conversation = self.get_or_create_conversation(user_id)
+        # 2. Añadir mensaje del usuario solo en memoria: se persiste junto con
+        # la respuesta y el estado en la única escritura del turno
+        self._append_message(conversation, MessageRole.USER, message_content)
         logger.info(f"Estado actual: {conversation.state.value}")
 
+        try:
+            return await self._dispatch_turn(
+                conversation,
+                user_id,
+                message_content,
+                max_tokens,
+                temperature
+            )
+        finally:
+            # Cada rama guarda al agregar su respuesta; si alguna no respondió
+            # (o falló), igual se guarda el mensaje del usuario
+            if conversation.is_dirty:
+                self.repo.save(conversation)
+    
+    async def _dispatch_turn(
+        self,
+        conversation: Conversation,
+        user_id: str,
+        message_content: str,
+        max_tokens: Optional[int],
+        temperature: Optional[float]
+    ) -> tuple[str, Optional[ActionData]]:
+        """
+        Resuelve el turno: flujo activo, acción detectada o respuesta del modelo.
+        
+        La respuesta se agrega con add_message/add_message_async, que guarda en
+        una sola escritura el mensaje del usuario, la respuesta y el estado.
+        """
         # 3. Si hay un flujo activo, procesarlo
         if conversation.is_in_flow():
             return await self._process_state_flow(
@@ -370,7 +471,12 @@ class ConversationService:
             temperature=temperature
         )
 
-        self.add_message(user_id=user_id, role=MessageRole.ASSISTANT, content=response)
+        self.add_message(
+            user_id=user_id,
+            role=MessageRole.ASSISTANT,
+            content=response,
+            conversation=conversation
+        )
 
         return response, None
     
@@ -379,7 +485,7 @@ class ConversationService:
         conversation: Conversation,
         user_id: str,
         message: str
-    ) -> tuple[str, Optional[dict]]:
+    ) -> tuple[str, Optional[ActionData]]:
         """
         Procesa el mensaje según el estado actual.
         """
@@ -411,9 +517,8 @@ class ConversationService:
     def _format_date(self, fecha: str) -> str:
         """Formatea una fecha para mostrar al usuario."""
         try:
-            from datetime import datetime
             fecha_dt = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-            return fecha_dt.strftime("%d de %B de %Y")
+            return format_date_spanish(fecha_dt)
         except:
             return fecha
 
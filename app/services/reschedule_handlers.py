@@ -9,14 +9,124 @@ Este módulo contiene todos los handlers necesarios para:
 2. Reprogramar cita (solicitar fecha, hora, confirmar)
 """
 
-from app.infrastructure.http.seguimiento_client import SeguimientoClient
-from typing import Optional, Dict, Tuple
-from datetime import datetime, timedelta
-from app.domain.models import Conversation, MessageRole, ConversationState
-from app.core.logging import get_logger
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from app.infrastructure.http import get_seguimiento_client
+from typing import Any, Optional, Dict, Set, Tuple
+from datetime import date, datetime, timedelta
+from app.domain.models import ActionData, Conversation, MessageRole, ConversationState
+from app.core.logging import get_logger, log_enter_exit
+from app.utils.validators import MONTHS_ES, format_date_spanish
+from app.services.patient_service import get_patient_service
+from app.services.appointment_service import get_appointment_service
+
+try:
+    # Parser ISO 8601 en C; acepta el sufijo 'Z' directamente
+    from ciso8601 import parse_datetime as _parse_iso_raw
+except ImportError:
+    def _parse_iso_raw(value: str) -> datetime:
+        """Fallback sin ciso8601 (Python 3.10 no acepta 'Z' en fromisoformat)."""
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+
+# La misma fecha se parsea varias veces por turno (validar, formatear);
+# datetime es inmutable, así que el resultado se puede compartir
+_parse_iso = lru_cache(maxsize=512)(_parse_iso_raw)
 
 logger = get_logger(__name__)
 
+# Referencias a tareas en segundo plano (evita que el GC las cancele)
+_BG_TASKS: Set[asyncio.Task] = set()
+
+
+def _on_notification_done(task: asyncio.Task) -> None:
+    """Libera la tarea de notificación y registra errores sin afectar al usuario."""
+    _BG_TASKS.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Error enviando notificación urgente: %s", task.exception())
+
+
+# Caché de verificación de pacientes: user_id -> (instante, registrado, datos).
+# Ordenada por uso: al superar el máximo se descarta la menos reciente
+_PATIENT_CACHE: "OrderedDict[str, Tuple[float, bool, Optional[Dict[str, Any]]]]" = OrderedDict()
+_PATIENT_CACHE_TTL = 60.0  # segundos
+_PATIENT_CACHE_MAX = 1024  # entradas
+
+
+async def _cached_verify(
+    phone: str,
+    ttl: float = _PATIENT_CACHE_TTL
+) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Verifica al paciente reutilizando el resultado reciente si sigue vigente.
+    
+    Args:
+        phone: Número de teléfono (user_id)
+        ttl: Segundos de validez de la entrada
+    
+    Returns:
+        Tupla (registrado, datos_paciente)
+    """
+    now = time.monotonic()
+    hit = _PATIENT_CACHE.get(phone)
+    if hit is not None:
+        if now - hit[0] < ttl:
+            _PATIENT_CACHE.move_to_end(phone)
+            return hit[1], hit[2]
+        # Vencida: se descarta aunque la consulta de abajo falle
+        del _PATIENT_CACHE[phone]
+    
+    registered, data = await get_patient_service().verify_patient(phone_number=phone)
+    _PATIENT_CACHE[phone] = (now, registered, data)
+    if len(_PATIENT_CACHE) > _PATIENT_CACHE_MAX:
+        _PATIENT_CACHE.popitem(last=False)
+    return registered, data
+
+
+# Hora en cualquiera de los formatos que circulan en el flujo:
+# "14:30", "14:30:00.000Z", "2025-10-20T14:30:00.000Z", "143000"
+_HORA_RE = re.compile(r'(?:^|T)(\d{1,2})(?::?(\d{2}))?(?::?(\d{2}))?(?:\.\d+)?Z?$')
+
+# Parte de fecha (YYYY-MM-DD) de un timestamp ISO
+_FECHA_RE = re.compile(r'^\s*(\d{4}-\d{2}-\d{2})')
+
+# Respuestas de confirmación/cancelación (se comparan por palabra completa
+# para que "sin embargo" no cuente como "si"). Se comparan sin tildes.
+_ACCENTS = str.maketrans("áéíóúÁÉÍÓÚ", "aeiouAEIOU")
+_CONFIRM_RE = re.compile(
+    r'\b(?:si|yes|ok|confirmo|confirmar|dale|perfecto|esta bien)\b',
+    re.IGNORECASE
+)
+_CANCEL_RE = re.compile(r'\b(?:no|cancelar|espera)\b', re.IGNORECASE)  # cubre "mejor no", "no gracias"
+
+# Resultado compartido mientras el flujo de reprogramación sigue abierto
+_ACTION_IN_PROGRESS = ActionData(action="reschedule_appointment", status="in_progress")
+
+# Plantillas de respuesta del flujo (se formatean con format_map)
+_LOOKUP_TPL = (
+    "Tu próxima cita:\n\n"
+    "Fecha: {fecha}\n"
+    "Hora: {hora}\n"
+    "Tipo: {tipo}\n"
+    "Estado: {estado}\n\n"
+    "Te esperamos en CAÑADA DEL CARMEN. Si necesitas reprogramar, dímelo."
+)
+_CONFIRM_TPL = (
+    "Nueva cita:\n"
+    "{fecha} a las {hora}\n\n"
+    "¿Confirmas? (sí/no)"
+)
+_RESCHEDULED_TPL = (
+    "¡Cita reprogramada!\n\n"
+    "{fecha}\n"
+    "{hora}\n\n"
+    "Te esperamos en CAÑADA DEL CARMEN."
+)
+
 
 class RescheduleHandlers:
     """
@@ -26,11 +136,12 @@ class RescheduleHandlers:
     """
     
     @staticmethod
+    @log_enter_exit("handle_lookup_appointment")
     async def handle_lookup_appointment(
         conversation_service,
         conversation: Conversation,
         user_id: str
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """
         Maneja la consulta de próxima cita.
         
@@ -42,17 +153,11 @@ class RescheduleHandlers:
         Returns:
             Tupla (respuesta, datos_acción)
         """
-        logger.info("=====Consultando próxima cita=====")
         
         # Obtener información del paciente
-        from app.services.patient_service import get_patient_service
-        patient_service = get_patient_service()
-        
-        patient_registered, patient_data = await patient_service.verify_patient(
-            phone_number=user_id
-        )
-        logger.info(f"Patient registered: {patient_registered}")
-        logger.info(f"Patient data: {patient_data}")
+        patient_registered, patient_data = await _cached_verify(user_id)
+        logger.info("Patient registered: %s", patient_registered)
+        logger.info("Patient data: %s", patient_data)
         
         if not patient_registered or not patient_data:
             logger.info("Paciente no registrado o sin datos")
@@ -60,7 +165,7 @@ class RescheduleHandlers:
                 "No encuentro tu registro en el sistema. "
                 "Por favor comunícate al centro de salud para más información."
             )
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
         
         logger.info("Paciente registrado y con datos")
@@ -73,65 +178,60 @@ class RescheduleHandlers:
                 f"Hola {patient_data.get('nombre', 'paciente')}, "
                 f"no tienes citas programadas en este momento."
             )
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
         
         logger.info("Tienes citas programadas")
         # Formatear información
         try:
             fecha_programada = proxima_cita.get('fecha_programada', '')
-            fecha_obj = datetime.fromisoformat(fecha_programada.replace('Z', '+00:00'))
-            logger.info(f"Fecha programada: {fecha_obj}")
+            fecha_obj = _parse_iso(fecha_programada)
+            logger.info("Fecha programada: %s", fecha_obj)
             
-            fecha_legible = fecha_obj.strftime("%d de %B de %Y")
+            fecha_legible = format_date_spanish(fecha_obj)
             hora_legible = fecha_obj.strftime("%H:%M")
-            logger.info(f"Fecha legible: {fecha_legible}")
-            logger.info(f"Hora legible: {hora_legible}")
+            logger.info("Fecha legible: %s", fecha_legible)
+            logger.info("Hora legible: %s", hora_legible)
             
             estado = proxima_cita.get('estado', {})
             estado_desc = estado.get('descripcion', 'Programado')
-            logger.info(f"Estado: {estado_desc}")
+            logger.info("Estado: %s", estado_desc)
 
             tipo = proxima_cita.get('tipo', {})
             tipo_desc = tipo.get('descripcion', 'Control de Tuberculosis')
-            logger.info(f"Tipo: {tipo_desc}")
+            logger.info("Tipo: %s", tipo_desc)
             
             logger.info("Formateando información")
             logger.info("Generando respuesta")
-            response = (
-                f"Tu próxima cita:\n\n"
-                f"Fecha: {fecha_legible}\n"
-                f"Hora: {hora_legible}\n"
-                f"Tipo: {tipo_desc}\n"
-                f"Estado: {estado_desc}\n\n"
-                f"Te esperamos en CAÑADA DEL CARMEN. Si necesitas reprogramar, dímelo."
-            )
-            logger.info(f"Respuesta generada: {response}")
+            response = _LOOKUP_TPL.format_map({
+                "fecha": fecha_legible,
+                "hora": hora_legible,
+                "tipo": tipo_desc,
+                "estado": estado_desc
+            })
+            logger.info("Respuesta generada: %s", response)
         except Exception as e:
-            logger.info(f"Error formateando cita: {e}")
+            logger.info("Error formateando cita: %s", e)
             response = (
                 f"Hola {patient_data.get('nombre', 'paciente')}, "
                 f"tienes una cita programada. Comunícate al centro para más detalles."
             )
         
         logger.info("Agregando respuesta al chat")
-        conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+        await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
         
         logger.info("Generando datos de acción")
-        logger.info("========Fin de la consulta de próxima cita========")
-        return response, {
-            "action": "lookup_appointment",
-            "cita": proxima_cita
-        }
+        return response, ActionData(action="lookup_appointment", cita=proxima_cita)
     
     @staticmethod
+    @log_enter_exit("start_reschedule_flow")
     async def start_reschedule_flow(
         conversation_service,
         conversation: Conversation,
         user_id: str,
         message: str,
         params: Dict
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """
         Inicia el flujo de reprogramación.
         
@@ -145,30 +245,27 @@ class RescheduleHandlers:
         Returns:
             Tupla (respuesta, datos_acción)
         """
-        logger.info("=====Iniciando flujo de reprogramación======")
         
         # Verificar paciente
-        from app.services.patient_service import get_patient_service
-        patient_service = get_patient_service()
-        patient_registered, patient_data = await patient_service.verify_patient(
-            phone_number=user_id
-        )
+        patient_registered, patient_data = await _cached_verify(user_id)
 
-        logger.info(f"Patient registered: {patient_registered}")
-        logger.info(f"Patient data: {patient_data}")
+        logger.info("Patient registered: %s", patient_registered)
+        logger.info("Patient data: %s", patient_data)
         
         if not patient_registered:
             logger.info("Paciente no registrado")
 
             response = "No encuentro tu registro. Comunícate al centro de salud."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            # detect_action ya dejó la conversación en el flujo: no hay nada que reprogramar
+            conversation.clear_state()
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
         
         logger.info("Paciente registrado")
         # Verificar cita existente
         proxima_cita = patient_data.get('proxima_cita')
 
-        logger.info(f"Proxima cita: {proxima_cita}")
+        logger.info("Proxima cita: %s", proxima_cita)
         if not proxima_cita:
             logger.info("No tienes citas para reprogramar")
 
@@ -176,79 +273,89 @@ class RescheduleHandlers:
                 f"Hola {patient_data.get('nombre', 'paciente')}, "
                 f"no tienes citas para reprogramar."
             )
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            conversation.clear_state()
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
         
         logger.info("Tienes citas para reprogramar")
         # Extraer datos
         extracted_data = params.get("extracted_data", {})
         patient_id = patient_data.get("id")
-        logger.info(f"Patient id: {patient_id}")
+        logger.info("Patient id: %s", patient_id)
         cita_id = proxima_cita.get("id")
 
-        logger.info(f"Cita id: {cita_id}")
+        logger.info("Cita id: %s", cita_id)
         
+        # Si tiene fecha, validarla antes de avanzar el flujo
+        logger.info("Verificando fecha")
+        fecha_valida = False
+        motivo_rechazo = ""
+        if extracted_data.get("fecha"):
+            try:
+                fecha_valida, motivo_rechazo = RescheduleHandlers._validate_business_date(
+                    _parse_iso(extracted_data["fecha"])
+                )
+            except ValueError:
+                motivo_rechazo = "Fecha inválida."
+
+            if not fecha_valida:
+                logger.info("Fecha rechazada: %s", motivo_rechazo)
+
+        # Estado final del turno, calculado antes de escribirlo una sola vez
+        state_data = {
+            "patient_id": patient_id,
+            "patient_name": patient_data.get("nombre"),
+            "cita_id": cita_id,
+            "cita_actual": proxima_cita
+        }
+        target_state = ConversationState.RESCHEDULE_WAITING_DATE
+        if fecha_valida:
+            target_state = ConversationState.RESCHEDULE_WAITING_TIME
+            state_data["fecha"] = extracted_data["fecha"]
+            if extracted_data.get("hora"):
+                target_state = ConversationState.RESCHEDULE_CONFIRMING
+                state_data["hora"] = extracted_data["hora"]
+
         # Guardar estado
-        logger.info("Guardando estado en Conversation" + ConversationState.RESCHEDULE_WAITING_DATE.name)
+        logger.info("Guardando estado en Conversation %s", target_state.name)
 
-        conversation.set_state(
-            ConversationState.RESCHEDULE_WAITING_DATE,
-            patient_id=patient_id,
-            patient_name=patient_data.get("nombre"),
-            cita_id=cita_id,
-            cita_actual=proxima_cita,
-            extracted_data=extracted_data
-        )
+        conversation.set_state(target_state, **state_data)
+        # fecha/hora se guardan solo como claves de primer nivel en state_data
+        conversation.state_data.pop("extracted_data", None)
 
         logger.info("Estado guardado")
-        
-        # Si tiene fecha
-        logger.info("Verificando fecha")
-        if extracted_data.get("fecha"):
-            logger.info("Tiene fecha")
 
-            conversation.state_data["fecha"] = extracted_data["fecha"]
-            conversation.state_data["extracted_data"] = extracted_data
-            conversation.state = ConversationState.RESCHEDULE_WAITING_TIME
-
-            logger.info("Estado actualizado")
+        if fecha_valida:
+            logger.info("Tiene fecha")
             
             if extracted_data.get("hora"):
                 logger.info("Tiene hora")
 
-                conversation.state_data["hora"] = extracted_data["hora"]
-                conversation.state_data["extracted_data"] = extracted_data
-                conversation.state = ConversationState.RESCHEDULE_CONFIRMING
-
-                logger.info("Estado actualizado")
-
-                conversation_service.repo.save(conversation)
-
-                logger.info("Conversation guardada")
-                
-                logger.info(f"Pasando a confirmación con fecha={extracted_data['fecha']}, hora={extracted_data['hora']}")
-                logger.info(f"State data guardado: {conversation.state_data}")
+                logger.info("Pasando a confirmación con fecha=%s, hora=%s", extracted_data['fecha'], extracted_data['hora'])
+                logger.info("State data guardado: %s", conversation.state_data)
                 
+                # handle_reschedule_confirm persiste todo el estado con su respuesta
                 return await RescheduleHandlers.handle_reschedule_confirm(
                     conversation_service, conversation, user_id, message
                 )
-            conversation_service.repo.save(conversation)
 
-            logger.info(f"Esperando hora. Fecha guardada: {extracted_data['fecha']}")
+            logger.info("Esperando hora. Fecha guardada: %s", extracted_data['fecha'])
             
             response = (
                 f"Perfecto, para el {RescheduleHandlers._format_date(extracted_data['fecha'])}. "
                 f"¿A qué hora? (7:00 - 19:00)"
             )
+        elif motivo_rechazo:
+            response = f"{motivo_rechazo} ¿Para qué día la reprogramamos? (Ej: mañana, lunes)"
         else:
             # Pedir fecha
             logger.info("Pedir fecha")
             try:
                 fecha_actual = proxima_cita.get('fecha_programada', '')
-                fecha_obj = datetime.fromisoformat(fecha_actual.replace('Z', '+00:00'))
-                fecha_legible = fecha_obj.strftime("%d de %B a las %H:%M")
+                fecha_obj = _parse_iso(fecha_actual)
+                fecha_legible = f"{fecha_obj.day:02d} de {MONTHS_ES[fecha_obj.month]} a las {fecha_obj:%H:%M}"
                 
-                logger.info(f"Fecha actual: {fecha_legible}")
+                logger.info("Fecha actual: %s", fecha_legible)
 
                 response = (
                     f"Tu cita actual es el {fecha_legible}. "
@@ -258,27 +365,21 @@ class RescheduleHandlers:
                 logger.info("Error al obtener fecha actual")
                 response = "¿Para qué día quieres reprogramar tu cita?"
         
-        logger.info("Guardando conversation")
-        
-        conversation_service.repo.save(conversation)
-
-        logger.info("Guardando message")
+        logger.info("Guardando conversation y message")
 
-        conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+        await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
         
-        logger.info("========Fin del handle_reschedule_date========")
-        
-        return response, {"action": "reschedule_appointment", "status": "in_progress"}
+        return response, _ACTION_IN_PROGRESS
     
     @staticmethod
+    @log_enter_exit("handle_reschedule_date")
     async def handle_reschedule_date(
         conversation_service,
         conversation: Conversation,
         user_id: str,
         message: str
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """Procesa la fecha ingresada."""
-        logger.info("======Procesando fecha para reprogramación======")
         
         # Extraer fecha
         logger.info("Extraer fecha")
@@ -286,7 +387,7 @@ class RescheduleHandlers:
         extracted_data = conversation_service.ai_service._extract_appointment_data(message)
         fecha = extracted_data.get("fecha")
         
-        logger.info(f"Fecha extraida: {fecha}")
+        logger.info("Fecha extraida: %s", fecha)
         
         if not fecha:
             logger.info("No entendí la fecha")
@@ -297,275 +398,194 @@ class RescheduleHandlers:
                 "25 de noviembre"
             )
             logger.info("Guardando message")
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-            logger.info("======Fin del handle_reschedule_date======")
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
         
         # Validar
         logger.info("Validar")
         try:
-            fecha_dt = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-            hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
-            fecha_dt = fecha_dt.replace(tzinfo=None)
-            
-            logger.info(f"Fecha validada: {fecha_dt}")
-
-            if fecha_dt < hoy:
-
-                logger.info("La fecha no puede ser en el pasado")
-                
-                response = "La fecha no puede ser en el pasado."
-                
-                logger.info("Guardando message")
-
-                conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-                
-                logger.info("======Fin del handle_reschedule_date======")
-                
-                return response, None
-            
-            if fecha_dt.weekday() == 6:
-                logger.info("No atendemos los domingos")
-
-                response = "No atendemos los domingos."
-
-                logger.info("Guardando message")
-                
-                conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-
-                logger.info("======Fin del handle_reschedule_date======")
-                
-                return response, None
+            fecha_dt = _parse_iso(fecha)
+            logger.info("Fecha validada: %s", fecha_dt)
         except Exception as e:
-            logger.info(f"Error validando: {e}")
+            logger.info("Error validando: %s", e)
 
             response = "Fecha inválida. Intenta de nuevo."
             
             logger.info("Guardando message")
             
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             return response, None
-        
-        # Guardar en state_data y actualizar estado
-        current_data = conversation.state_data.get("extracted_data", {})
-        current_data["fecha"] = fecha
 
-        logger.info(f"Guardando fecha en state_data: {current_data}")
+        fecha_ok, motivo_rechazo = RescheduleHandlers._validate_business_date(fecha_dt)
+        if not fecha_ok:
+            logger.info(motivo_rechazo)
+
+            response = motivo_rechazo
+
+            logger.info("Guardando message")
+
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
+
+            return response, None
         
-        conversation.set_state(
-            ConversationState.RESCHEDULE_WAITING_TIME,
-            fecha=fecha,
-            extracted_data=current_data
-        )
+        # Guardar en state_data y actualizar estado
+        logger.info("Guardando fecha en state_data: %s", fecha)
         
-        conversation_service.repo.save(conversation)
+        conversation.state = ConversationState.RESCHEDULE_WAITING_TIME
+        conversation.update_state_data(fecha=fecha)
 
-        logger.info(f"Datos guardados en state_data: {conversation.state_data}")
+        logger.info("Datos guardados en state_data: %s", conversation.state_data)
         
         response = f"Perfecto, para el {RescheduleHandlers._format_date(fecha)}. ¿A qué hora?"
-        conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+        await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
-        logger.info("======Fin del handle_reschedule_date======")
-        
         return response, None
     
     @staticmethod
+    @log_enter_exit("handle_reschedule_time")
     async def handle_reschedule_time(
         conversation_service,   
         conversation: Conversation,
         user_id: str,
         message: str
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """Procesa la hora ingresada."""
-        logger.info("======Procesando hora======")
-        logger.info(f"Mensaje recibido: {message}")
+        logger.info("Mensaje recibido: %s", message)
         
         # Extraer hora
         extracted_data = conversation_service.ai_service._extract_appointment_data(message)
         hora = extracted_data.get("hora")
         
-        logger.info(f"Hora extraída: {hora}")
+        logger.info("Hora extraída: %s", hora)
         
         if not hora:
             logger.info("No entendí la hora")
 
             response = "No entendí la hora. Intenta: 10:00, 14:30, o indica AM/PM"
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-            
-            logger.info("======Fin del handle_reschedule_time======")
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             
             return response, None
         
-        # Validar - Limpiar hora primero
+        # Validar
         try:
-            hora_clean = hora.replace('.000Z', '').replace('T', '')
+            hora_h, hora_m = RescheduleHandlers._parse_hora(hora)
+        except ValueError as e:
+            logger.error("Error validando hora: %s", e)
+            logger.error("Hora recibida: %s", hora)
 
-            logger.info(f"Hora limpia: {hora_clean}")
-            
-            if hora_clean.count(':') == 2:
-                hora_dt = datetime.strptime(hora_clean, "%H:%M:%S")
+            response = "Hora inválida. Intenta con formato 10:00 o 14:30, puedes usar AM/PM."
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
-                logger.info(f"Hora parseada: {hora_dt.hour}:{hora_dt.minute:02d}")
-            elif hora_clean.count(':') == 1:
-                hora_dt = datetime.strptime(hora_clean, "%H:%M")
+            return response, None
 
-                logger.info(f"Hora parseada: {hora_dt.hour}:{hora_dt.minute:02d}")
-            else:
-                raise ValueError(f"Formato de hora no reconocido: {hora_clean}")
-            
-            if hora_dt.hour < 7 or hora_dt.hour >= 19:
-                logger.info("La hora no está dentro del horario de atención")   
+        logger.info("Hora parseada: %d:%02d", hora_h, hora_m)
+        
+        if hora_h < 7 or hora_h >= 19:
+            logger.info("La hora no está dentro del horario de atención")   
 
-                response = "El horario de atención es de 7:00 a 19:00. Por favor elige otra hora."
-                conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-                
-                logger.info("======Fin del handle_reschedule_time======")
-                
-                return response, None
+            response = "El horario de atención es de 7:00 a 19:00. Por favor elige otra hora."
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             
-            if hora_dt.minute not in [0, 30]:
-                logger.info("La hora no es cada 30 minutos")
-
-                response = "Las citas son cada 30 minutos (ej: 10:00, 10:30). Por favor ajusta la hora."
-                conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-                
-                logger.info("======Fin del handle_reschedule_time======")
-                
-                return response, None
-                
-        except Exception as e:
-            logger.error(f"Error validando hora: {e}")
-            logger.error(f"Hora recibida: {hora}")
-
-            response = "Hora inválida. Intenta con formato 10:00 o 14:30, puedes usar AM/PM."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            return response, None
+        
+        if hora_m not in (0, 30):
+            logger.info("La hora no es cada 30 minutos")
 
-            logger.info("======Fin del handle_reschedule_time======")
+            response = "Las citas son cada 30 minutos (ej: 10:00, 10:30). Por favor ajusta la hora."
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             
             return response, None
         
         # Guardar y confirmar
-        current_data = conversation.state_data.get("extracted_data", {})
-        current_data["hora"] = hora
-
-        logger.info(f"Datos guardados en state_data: {current_data}")
-        
-        conversation.set_state(
-            ConversationState.RESCHEDULE_CONFIRMING,
-            hora=hora,
-            extracted_data=current_data
-        )
-        conversation_service.repo.save(conversation)
+        conversation.state = ConversationState.RESCHEDULE_CONFIRMING
+        conversation.update_state_data(hora=hora)
         
-        logger.info(f"Datos completos guardados: {conversation.state_data}")
+        logger.info("Datos completos guardados: %s", conversation.state_data)
         
-        fecha = current_data.get("fecha")
+        fecha = conversation.state_data.get("fecha")
         
-        response = (
-            f"Nueva cita:\n"
-            f"{RescheduleHandlers._format_date(fecha)} a las {RescheduleHandlers._format_time(hora)}\n\n"
-            f"¿Confirmas? (sí/no)"
-        )
+        response = _CONFIRM_TPL.format_map({
+            "fecha": RescheduleHandlers._format_date(fecha),
+            "hora": RescheduleHandlers._format_time(hora)
+        })
 
-        logger.info(f"Respuesta enviada: {response}")
+        logger.info("Respuesta enviada: %s", response)
 
-        conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-        
-        logger.info("======Fin del handle_reschedule_confirm======")
+        await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
         
         return response, None
     
     @staticmethod
+    @log_enter_exit("handle_reschedule_confirm")
     async def handle_reschedule_confirm(
         conversation_service,
         conversation: Conversation,
         user_id: str,
         message: str
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """Procesa la confirmación."""
-        logger.info("======Procesando confirmación======")
         
         # Validar que message no sea None
         if not message or message.strip() == "":
             logger.info("No recibí tu respuesta. Por favor responde 'sí' o 'no'.")
 
             response = "No recibí tu respuesta. Por favor responde 'sí' o 'no'."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-            
-            logger.info("======Fin del handle_reschedule_confirm======")
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             
             return response, None
         
-        message_lower = message.lower().strip()
-
-        logger.info(f"Mensaje recibido: {message_lower}")
+        logger.info("Mensaje recibido: %s", message)
         
-        confirmations = ['si', 'sí', 'yes', 'ok', 'confirmo', 'confirmar', 'dale', 'perfecto', 'está bien', 'esta bien']
-        cancellations = ['no', 'cancelar', 'espera', 'mejor no', 'no gracias']
+        message_norm = message.translate(_ACCENTS)
         
-        if any(word in message_lower for word in cancellations):
+        if _CANCEL_RE.search(message_norm):
             conversation.clear_state()
-            conversation_service.repo.save(conversation)
             
             response = "Tu cita se mantiene sin cambios."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
             logger.info("Tu cita se mantiene sin cambios.")
             
-            logger.info("======Fin del handle_reschedule_confirm======")
-            
             return response, None
         
-        if not any(word in message_lower for word in confirmations):
+        if not _CONFIRM_RE.search(message_norm):
             response = "Por favor responde 'sí' para confirmar o 'no' para cancelar."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
             logger.info("Por favor responde 'sí' para confirmar o 'no' para cancelar.")
             
-            logger.info("======Fin del handle_reschedule_confirm======")
-            
             return response, None
         
         # Reprogramar - Validar que existan los datos en el estado
-        extracted_data = conversation.state_data.get("extracted_data", {})
-        fecha = conversation.state_data.get("fecha") or extracted_data.get("fecha")
-        hora = conversation.state_data.get("hora") or extracted_data.get("hora")
-        
-        patient_id = conversation.state_data.get("patient_id")
-        cita_id = conversation.state_data.get("cita_id")
-
-        logger.info(f"Datos recuperados para confirmacion: fecha={fecha}, hora={hora}, patient_id={patient_id}, cita_id={cita_id}")
-        logger.info(f"State data completo: {conversation.state_data}")
+        state_data = conversation.state_data
 
-        if not fecha or not hora or not patient_id:
-            logger.error(f"Datos faltantes en estado: fecha={fecha}, hora={hora}, patient_id={patient_id}")
-            logger.error(f"State data actual: {conversation.state_data}")
+        if not all(state_data.get(key) for key in ("fecha", "hora", "patient_id")):
+            logger.error("Datos faltantes en estado: %s", state_data)
 
             conversation.clear_state()
-            conversation_service.repo.save(conversation)
             response = "Hubo un error. Por favor intenta reprogramar de nuevo."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
             logger.info("Hubo un error. Por favor intenta reprogramar de nuevo.")
-            logger.info("======Fin del handle_reschedule_confirm======")
 
             return response, None
         
+        fecha = state_data["fecha"]
+        hora = state_data["hora"]
+        patient_id = state_data["patient_id"]
+
+        logger.info("Datos recuperados para confirmacion: fecha=%s, hora=%s, patient_id=%s, cita_id=%s", fecha, hora, patient_id, state_data.get('cita_id'))
+        
         try:
-            fecha_clean = fecha.split('T')[0] if 'T' in fecha else fecha
-            hora_clean = hora.split('.')[0].split('T')[-1] if 'Z' in hora or 'T' in hora else hora
+            fecha_clean = RescheduleHandlers._clean_fecha(fecha)
+            hora_h, hora_m = RescheduleHandlers._parse_hora(hora)
+            hora_clean = f"{hora_h:02d}:{hora_m:02d}:00"
             
-            logger.info(f"Datos limpios: fecha={fecha_clean}, hora={hora_clean}")
+            logger.info("Datos limpios: fecha=%s, hora=%s", fecha_clean, hora_clean)
             
-            # Validar formato de hora
-            if ':' not in hora_clean:
-                hora_clean = hora_clean[:2] + ':' + hora_clean[2:4] + ':' + hora_clean[4:] if len(hora_clean) >= 6 else hora_clean + ':00:00'
-                logger.info(f"Hora limpiada: {hora_clean}")
-            
-            from app.services.appointment_service import get_appointment_service
             appointment_service = get_appointment_service()
             
-            logger.info(f"Reprogramando: patient_id={patient_id}, fecha={fecha_clean}, hora={hora_clean}")
+            logger.info("Reprogramando: patient_id=%s, fecha=%s, hora=%s", patient_id, fecha_clean, hora_clean)
             
             cita = await appointment_service._update_appointment(
                 patient_id=str(patient_id),
@@ -574,19 +594,23 @@ class RescheduleHandlers:
                 motivo="Control de Tuberculosis"
             )
 
-            logger.info(f"Cita reprogramada: {cita}")
+            logger.info("Cita reprogramada: %s", cita)
             
             if cita:
-                response = (
-                    f"¡Cita reprogramada!\n\n"
-                    f"{RescheduleHandlers._format_date(fecha)}\n"
-                    f"{RescheduleHandlers._format_time(hora)}\n\n"
-                    f"Te esperamos en CAÑADA DEL CARMEN."
-                )
+                # La próxima cita cambió: forzar nueva verificación
+                _PATIENT_CACHE.pop(user_id, None)
+                response = _RESCHEDULED_TPL.format_map({
+                    "fecha": RescheduleHandlers._format_date(fecha),
+                    "hora": RescheduleHandlers._format_time(hora)
+                })
 
                 logger.info("Cita reprogramada exitosamente.")
 
-                action_data = {"action": "reschedule_appointment", "status": "completed", "cita": cita}
+                action_data = ActionData(
+                    action="reschedule_appointment",
+                    status="completed",
+                    cita=cita
+                )
             else:
                 response = "Error al reprogramar. Intenta de nuevo."
                 
@@ -594,9 +618,7 @@ class RescheduleHandlers:
                 
                 action_data = None
         except Exception as e:
-            logger.error(f"Error reprogramando: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error reprogramando: %s", e)
             response = "Ocurrió un error. Intenta de nuevo."
             action_data = None
         
@@ -604,40 +626,37 @@ class RescheduleHandlers:
         logger.info("Limpiando estado...")
 
         conversation.clear_state()
-        conversation_service.repo.save(conversation)
         
         logger.info("Estado limpiado.")
         
-        conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+        await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
-        logger.info("Mensaje enviado: {response}")        
-        logger.info("======Fin del handle_reschedule_confirm======")
+        logger.info("Mensaje enviado: %s", response)        
         
         return response, action_data
 
     # Metodo para capturar cuando un paciente esta en riesgo de salud o pide urgencia de atencion de un supervisor
     @staticmethod
+    @log_enter_exit("handle_urgent_request")
     async def handle_urgent_request(
         conversation_service,
         conversation: Conversation,
         user_id: str, 
         message: str
-    ) -> Tuple[str, Optional[Dict]]:
+    ) -> Tuple[str, Optional[ActionData]]:
         """Procesando solicitud de atencion urgente"""
-        logger.info("======Inicio del handle_urgent_request======")
 
         if not message or message.strip() == "":
             logger.info("No se proporciono un mensaje.")
 
             response = "Por favor proporciona un mensaje."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
-            logger.info("======Fin del handle_urgent_request======")
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
             
             return response, None
 
         message_lower = message.lower().strip()
 
-        logger.info(f"Mensaje en minusculas: {message_lower}")
+        logger.info("Mensaje en minusculas: %s", message_lower)
 
         # Keywords para detectar si el paciente esta en riesgo de salud mediante el mensaje que el nos envia
         urgent_keywords = [
@@ -653,30 +672,93 @@ class RescheduleHandlers:
 
         if any(word in message_lower for word in urgent_keywords):
             conversation.clear_state()
-            conversation_service.repo.save(conversation)
 
             logger.info("Solicitud de atencion urgente detectada.")
 
             response = "Ya designamos a un supervisor para atender tu solicitud."
-            conversation_service.add_message(user_id, MessageRole.ASSISTANT, response)
+            await conversation_service.add_message_async(user_id, MessageRole.ASSISTANT, response, conversation)
 
-            # Enviar notificacion al supervisor mediante el servicio de seguimiento
-            seguimiento_client = SeguimientoClient()
-            await seguimiento_client.notification_paciente_urgent(user_id)
+            # Enviar notificacion al supervisor en segundo plano para no
+            # retrasar la respuesta al paciente
+            seguimiento_client = get_seguimiento_client()
+            task = asyncio.create_task(
+                seguimiento_client.notification_paciente_urgent(user_id)
+            )
+            _BG_TASKS.add(task)
+            task.add_done_callback(_on_notification_done)
             
-            logger.info("======Fin del handle_urgent_request======")
             return response, None
 
-        logger.info("======Fin del handle_urgent_request======")
-        
         return None, None
     
+    @staticmethod
+    def _parse_hora(hora: str) -> Tuple[int, int]:
+        """
+        Extrae hora y minutos de una hora en formato ISO o compacto.
+        
+        Args:
+            hora: Hora (ej: "14:30", "14:30:00.000Z", "T14:30:00")
+        
+        Returns:
+            Tupla (hora, minutos)
+        
+        Raises:
+            ValueError: Si el formato no es reconocido o está fuera de rango
+        """
+        match = _HORA_RE.search(hora.strip())
+        if not match:
+            raise ValueError(f"Formato de hora no reconocido: {hora}")
+        
+        hora_h = int(match.group(1))
+        hora_m = int(match.group(2) or 0)
+        if hora_h > 23 or hora_m > 59:
+            raise ValueError(f"Hora fuera de rango: {hora}")
+        
+        return hora_h, hora_m
+    
+    @staticmethod
+    def _clean_fecha(fecha: str) -> str:
+        """
+        Extrae la fecha (YYYY-MM-DD) de un timestamp ISO.
+        
+        Args:
+            fecha: Fecha (ej: "2025-11-25T00:00:00.000Z", "2025-11-25")
+        
+        Returns:
+            Fecha sin hora, o el valor original si no tiene ese formato
+        """
+        match = _FECHA_RE.match(fecha)
+        return match.group(1) if match else fecha
+    
+    @staticmethod
+    def _validate_business_date(
+        fecha_dt: datetime,
+        hoy: Optional[date] = None
+    ) -> Tuple[bool, str]:
+        """
+        Valida que la fecha sea un día hábil de atención.
+        
+        Args:
+            fecha_dt: Fecha solicitada
+            hoy: Fecha de referencia (por defecto date.today())
+        
+        Returns:
+            Tupla (es_valida, motivo_rechazo)
+        """
+        if fecha_dt.date() < (hoy or date.today()):
+            return False, "La fecha no puede ser en el pasado."
+        
+        if fecha_dt.weekday() == 6:
+            return False, "No atendemos los domingos."
+        
+        return True, ""
+    
     @staticmethod
     def _format_date(fecha: str) -> str:
         """Formatea fecha."""
         try:
-            fecha_dt = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-            return fecha_dt.strftime("%d de %B de %Y")
+            fecha_dt = _parse_iso(fecha)
+            return format_date_spanish(fecha_dt)
         except:
             return fecha
     
@@ -684,7 +766,7 @@ class RescheduleHandlers:
     def _format_time(hora: str) -> str:
         """Formatea hora."""
         try:
-            hora_clean = hora.replace(':00.000Z', '').replace('T', ' ')
-            return hora_clean.split(' ')[-1][:5]
-        except:
+            hora_h, hora_m = RescheduleHandlers._parse_hora(hora)
+            return f"{hora_h:02d}:{hora_m:02d}"
+        except ValueError:
             return hora
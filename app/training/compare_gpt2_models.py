@@ -6,25 +6,53 @@ Compara respuestas del modelo base GPT-2 español vs el modelo fine-tuned
 con conversaciones médicas.
 """
 
+import sys
 import torch
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from transformers import GPT2LMHeadModel, GPT2Tokenizer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Contexto de sistema (igual que en entrenamiento). Termina sin espacios para
+# que tokenizarlo aparte produzca los mismos tokens que el texto completo.
+SYSTEM_PROMPT = (
+    "Eres un asistente virtual EXCLUSIVO del servicio de Tuberculosis del centro de salud CAÑADA DEL CARMEN.\n\n"
+    "REGLAS IMPORTANTES:\n"
+    "1. SOLO atiendes consultas sobre TUBERCULOSIS\n"
+    "2. Máximo 2 oraciones por respuesta\n"
+    "3. Usa el nombre del paciente si lo conoces\n"
+    "4. Sé profesional y empático\n"
+    "5. Si preguntan por otro servicio, redirige amablemente"
+)
+
 
 class ModelComparator:
     """Comparador de modelos GPT-2."""
     
-    def __init__(self, base_model_name: str, finetuned_model_path: str):
+    def __init__(self, base_model_name: str, finetuned_model_path: str, load_in_8bit: bool = False):
+        """
+        Args:
+            base_model_name: Modelo base en HuggingFace
+            finetuned_model_path: Ruta del modelo fine-tuned
+            load_in_8bit: Cargar el fine-tuned en int8 (solo CUDA, requiere bitsandbytes)
+        """
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"🖥️  Dispositivo: {self.device}")
+        # FP16 en GPU (mitad de bytes por paso de decodificación); en CPU se
+        # mantiene FP32, la precisión reducida suele ser más lenta sin AMX
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+        logger.info("🖥️  Dispositivo: %s (%s)", self.device, self.dtype)
         
         # Cargar modelo base
-        logger.info(f"📦 Cargando modelo BASE: {base_model_name}")
+        logger.info("📦 Cargando modelo BASE: %s", base_model_name)
         self.base_tokenizer = GPT2Tokenizer.from_pretrained(base_model_name)
-        self.base_model = GPT2LMHeadModel.from_pretrained(base_model_name)
+        self.base_model = GPT2LMHeadModel.from_pretrained(
+            base_model_name,
+            torch_dtype=self.dtype,
+            low_cpu_mem_usage=True
+        )
         
         # Configurar pad_token
         if self.base_tokenizer.pad_token is None:
@@ -33,22 +61,65 @@ class ModelComparator:
         
         self.base_model.to(self.device)
         self.base_model.eval()
+        self.base_prefix_ids, self.base_prefix_kv = self._encode_prefix(self.base_model, self.base_tokenizer)
         logger.info("✅ Modelo BASE cargado")
         
         # Cargar modelo fine-tuned
-        logger.info(f"📦 Cargando modelo FINE-TUNED: {finetuned_model_path}")
+        logger.info("📦 Cargando modelo FINE-TUNED: %s", finetuned_model_path)
         self.ft_tokenizer = GPT2Tokenizer.from_pretrained(finetuned_model_path)
-        self.ft_model = GPT2LMHeadModel.from_pretrained(finetuned_model_path)
+        ft_8bit = load_in_8bit and self._bitsandbytes_available()
+        if ft_8bit:
+            # int8: la cuarta parte de bytes de pesos; accelerate lo ubica en la GPU
+            self.ft_model = GPT2LMHeadModel.from_pretrained(
+                finetuned_model_path,
+                load_in_8bit=True,
+                device_map="auto"
+            )
+        else:
+            self.ft_model = GPT2LMHeadModel.from_pretrained(
+                finetuned_model_path,
+                torch_dtype=self.dtype,
+                low_cpu_mem_usage=True
+            )
         
         # Configurar pad_token
         if self.ft_tokenizer.pad_token is None:
             self.ft_tokenizer.pad_token = self.ft_tokenizer.eos_token
             self.ft_tokenizer.pad_token_id = self.ft_tokenizer.eos_token_id
         
-        self.ft_model.to(self.device)
+        if not ft_8bit:
+            self.ft_model.to(self.device)
         self.ft_model.eval()
+        self.ft_prefix_ids, self.ft_prefix_kv = self._encode_prefix(self.ft_model, self.ft_tokenizer)
         logger.info("✅ Modelo FINE-TUNED cargado")
     
+    def _bitsandbytes_available(self) -> bool:
+        """Verifica si se puede cargar en int8 (CUDA + bitsandbytes instalado)."""
+        if self.device != "cuda":
+            logger.warning("⚠️  int8 requiere CUDA; se usa el modelo sin cuantizar")
+            return False
+        try:
+            import bitsandbytes  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️  bitsandbytes no está instalado; se usa el modelo sin cuantizar")
+            return False
+        return True
+    
+    def _encode_prefix(self, model, tokenizer):
+        """
+        Tokeniza el contexto de sistema y calcula su caché de atención.
+        
+        El prefijo es idéntico en todos los prompts, así que su forward pass
+        se hace una sola vez y generate() solo procesa los tokens del turno.
+        
+        Returns:
+            Tupla (prefix_ids en el dispositivo, past_key_values)
+        """
+        prefix_ids = tokenizer(SYSTEM_PROMPT, return_tensors="pt").input_ids.to(self.device)
+        with torch.inference_mode():
+            past_key_values = model(prefix_ids, use_cache=True).past_key_values
+        return prefix_ids, past_key_values
+    
     def generate_response(self, model, tokenizer, prompt: str, max_tokens: int = 80) -> str:
         """
         Genera respuesta con el modelo dado.
@@ -57,35 +128,25 @@ class ModelComparator:
         El prompt debe incluir el contexto de sistema completo.
         """
         
-        # Formatear prompt con contexto de sistema (igual que en entrenamiento)
-        formatted_prompt = (
-            "Eres un asistente virtual EXCLUSIVO del servicio de Tuberculosis del centro de salud CAÑADA DEL CARMEN.\n\n"
-            "REGLAS IMPORTANTES:\n"
-            "1. SOLO atiendes consultas sobre TUBERCULOSIS\n"
-            "2. Máximo 2 oraciones por respuesta\n"
-            "3. Usa el nombre del paciente si lo conoces\n"
-            "4. Sé profesional y empático\n"
-            "5. Si preguntan por otro servicio, redirige amablemente\n\n"
-            f"Paciente: {prompt}\n"
-            "Asistente:"
-        )
+        # El contexto de sistema ya está tokenizado; solo se tokeniza el turno
+        if tokenizer is self.base_tokenizer:
+            prefix_ids, prefix_kv = self.base_prefix_ids, self.base_prefix_kv
+        else:
+            prefix_ids, prefix_kv = self.ft_prefix_ids, self.ft_prefix_kv
+        turn_ids = tokenizer(f"\n\nPaciente: {prompt}\nAsistente:", return_tensors="pt").input_ids
         
-        # Tokenizar
-        inputs = tokenizer(
-            formatted_prompt,
-            return_tensors="pt",
-            padding=True,
-            return_attention_mask=True
-        )
-        
-        input_ids = inputs["input_ids"].to(self.device)
-        attention_mask = inputs["attention_mask"].to(self.device)
+        # El prefijo ya vive en el dispositivo: solo se copian los ids del turno
+        turn_ids = turn_ids.to(self.device, non_blocking=True)
+        input_ids = torch.cat([prefix_ids, turn_ids], dim=1)
+        attention_mask = torch.ones_like(input_ids)
         
         # Generar
-        with torch.no_grad():
+        with torch.inference_mode():
             outputs = model.generate(
                 input_ids,
                 attention_mask=attention_mask,
+                past_key_values=prefix_kv,
+                use_cache=True,
                 max_new_tokens=max_tokens,
                 temperature=0.8,
                 do_sample=True,
@@ -109,39 +170,52 @@ class ModelComparator:
         
         return response
     
-    def compare(self, test_prompts: list):
-        """Compara ambos modelos con los prompts de prueba."""
+    def compare(self, test_prompts: list, interactive: bool = False):
+        """
+        Compara ambos modelos con los prompts de prueba.
+        
+        Args:
+            test_prompts: Mensajes de paciente a evaluar
+            interactive: Pausar tras cada prompt hasta que se presione ENTER
+        """
         
         logger.info("")
         logger.info("=" * 80)
         logger.info("🔍 COMPARACIÓN DE MODELOS")
         logger.info("=" * 80)
         
-        for idx, prompt in enumerate(test_prompts, 1):
-            print("\n" + "=" * 80)
-            print(f"Prueba {idx}/{len(test_prompts)}")
-            print("=" * 80)
-            print(f"\n👤 USUARIO: {prompt}\n")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for idx, prompt in enumerate(test_prompts, 1):
+                print("\n" + "=" * 80)
+                print(f"Prueba {idx}/{len(test_prompts)}")
+                print("=" * 80)
+                print(f"\n👤 USUARIO: {prompt}\n")
+            
+                # Ambos modelos son independientes: generar en paralelo
+                # (PyTorch libera el GIL durante los kernels)
+                base_future = pool.submit(self.generate_response, self.base_model, self.base_tokenizer, prompt)
+                ft_future = pool.submit(self.generate_response, self.ft_model, self.ft_tokenizer, prompt)
             
-            # Respuesta del modelo base
-            base_response = self.generate_response(self.base_model, self.base_tokenizer, prompt)
-            print(f"🤖 MODELO BASE:")
-            print(f"   {base_response}\n")
+                # Respuesta del modelo base
+                base_response = base_future.result()
+                print(f"🤖 MODELO BASE:")
+                print(f"   {base_response}\n")
             
-            # Respuesta del modelo fine-tuned
-            ft_response = self.generate_response(self.ft_model, self.ft_tokenizer, prompt)
-            print(f"✨ MODELO FINE-TUNED:")
-            print(f"   {ft_response}\n")
+                # Respuesta del modelo fine-tuned
+                ft_response = ft_future.result()
+                print(f"✨ MODELO FINE-TUNED:")
+                print(f"   {ft_response}\n")
             
-            # Comparar longitud
-            if len(ft_response) > len(base_response):
-                print("📊 El modelo fine-tuned generó una respuesta más completa")
-            elif len(ft_response) < len(base_response):
-                print("📊 El modelo base generó una respuesta más completa")
-            else:
-                print("📊 Ambas respuestas tienen longitud similar")
+                # Comparar longitud
+                if len(ft_response) > len(base_response):
+                    print("📊 El modelo fine-tuned generó una respuesta más completa")
+                elif len(ft_response) < len(base_response):
+                    print("📊 El modelo base generó una respuesta más completa")
+                else:
+                    print("📊 Ambas respuestas tienen longitud similar")
             
-            input("\n⏸️  Presiona ENTER para continuar...")
+                if interactive:
+                    input("\n⏸️  Presiona ENTER para continuar...")
         
         print("\n" + "=" * 80)
         print("✅ Comparación completada")
@@ -151,6 +225,17 @@ class ModelComparator:
 def main():
     """Función principal."""
     
+    parser = argparse.ArgumentParser(description="Comparación GPT-2 base vs fine-tuned")
+    parser.add_argument("--no-interactive", action="store_true", help="No pausar entre prompts")
+    parser.add_argument(
+        "--8bit", dest="load_in_8bit", action="store_true",
+        help="Cargar el modelo fine-tuned en int8 (solo CUDA, requiere bitsandbytes)"
+    )
+    args = parser.parse_args()
+    
+    # Sin terminal (CI, benchmarks, salida redirigida) no hay quien presione ENTER
+    interactive = sys.stdout.isatty() and not args.no_interactive
+    
     # Configuración
     BASE_MODEL = "DeepESP/gpt2-spanish"
     FINETUNED_MODEL = "app/training/models/gpt2-spanish-medical"
@@ -168,10 +253,10 @@ def main():
     ]
     
     # Crear comparador
-    comparator = ModelComparator(BASE_MODEL, FINETUNED_MODEL)
+    comparator = ModelComparator(BASE_MODEL, FINETUNED_MODEL, load_in_8bit=args.load_in_8bit)
     
     # Comparar
-    comparator.compare(TEST_PROMPTS)
+    comparator.compare(TEST_PROMPTS, interactive=interactive)
 
 
 if __name__ == "__main__":
@@ -9,20 +9,51 @@ Autor: Sistema de IA
 Fecha: 19 de Octubre, 2025
 """
 
+import gc
 import json
 import random
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+try:
+    # Serializador JSON en C; escribe UTF-8 sin escapar por defecto
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        """Serializa a JSON (bytes UTF-8) con orjson."""
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj) -> bytes:
+        """Serializa a JSON (bytes UTF-8 sin escapar) con la librería estándar."""
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Caracteres que pueden iniciar una oración (mayúscula o apertura ¿ ¡)
+_SENT_START = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZÁÉÍÓÚÑ¿¡")
+
+# Carpeta de salida de los datasets (junto a este script)
+_DATASETS_DIR = Path(__file__).parent / "datasets"
+
+# Bloque <DATA> y cada cita dentro de "Citas = [...]"
+# (formato con %: evita las llaves escapadas y el format_map por cita)
+_DATA_TMPL = (
+    "Paciente_registrado = %s\n"
+    "Nombre = %s\n"
+    "Citas = %s\n"
+    "Ultima_visita = %s"
+)
+_CITA_TMPL = '{fecha: "%s", hora: "%s", estado: "%s"}'
+
 
 class LargeStructuredDatasetGenerator:
     """
     Generador MASIVO de datasets estructurados (2000-5000 ejemplos)
     """
     
-    def __init__(self, num_ejemplos: int = 3000):
+    def __init__(self, num_ejemplos: int = 3000, verbose: bool = True):
         self.num_ejemplos = num_ejemplos
+        # Mensajes de progreso por stdout (desactivar para corridas masivas/benchmarks)
+        self.verbose = verbose
         self.system_prompt = """Eres un asistente virtual especializado SOLO en Tuberculosis del centro de salud CAÑADA DEL CARMEN.
 Responde solo con información basada en los datos proporcionados en <DATA>.
 SI NO hay datos explícitos, debes responder: "No tengo esa información registrada".
@@ -30,6 +61,11 @@ NUNCA inventes nombres, fechas o información que no esté en <DATA>.
 Máximo 2 oraciones por respuesta.
 Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo consultas sobre Tuberculosis"."""
         
+        # Partes fijas del prompt, armadas una sola vez (el system prompt no cambia)
+        self._prompt_prefix = "<SYS>\n" + self.system_prompt + "\n</SYS>\n\n<DATA>\n"
+        self._prompt_mid = "\n</DATA>\n\n<USER>: "
+        self._prompt_suffix = "\n<ASSISTANT>:"
+        
         # 50 nombres variados
         self.nombres = [
             "Taison Perez", "María González", "Carlos Rodríguez", "Ana López", "Luis Martinez",
@@ -43,6 +79,11 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
             "Marcos Vázquez", "Claudia Guerrero", "Fabián Delgado", "Patricia Montes", "Óscar Navarro",
             "Silvia Escobar", "Ignacio Ramos", "Beatriz Cabrera", "Leonardo Fuentes", "Rosa Molina"
         ]
+        # Primer nombre de cada paciente, calculado una sola vez (para los saludos)
+        self.primer_nombre = {n: n.partition(' ')[0] for n in self.nombres}
+        # Valor de "Nombre = ..." en <DATA> ya entre comillas (None -> "None")
+        self._nombre_data = {n: f'"{n}"' for n in self.nombres}
+        self._nombre_data[None] = "None"
         
         # 30 variaciones de saludos del usuario
         self.saludos_user = [
@@ -278,59 +319,119 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
             "07:00", "07:30", "13:00", "13:30", "18:30", "19:00"
         ]
         
-        self.dataset = []
+        # Ejemplos como tuplas (prompt, completion); el dict JSON se arma al guardar
+        self.dataset: List[Tuple[str, str]] = []
+    
+    def _pick(self, pool: List, num: int) -> List:
+        """
+        Elige `num` elementos al azar (con reemplazo) de una sola vez.
+        
+        random.choices hace todas las elecciones en una llamada en lugar de
+        llamar a random.choice dentro del loop de cada generador.
+        """
+        return random.choices(pool, k=num)
+    
+    def _flips(self, num: int, p_true: float) -> List[bool]:
+        """Genera `num` valores booleanos, True con probabilidad p_true"""
+        return random.choices((True, False), weights=(p_true, 1 - p_true), k=num)
+    
+    def _log(self, message: str) -> None:
+        """Imprime un mensaje de progreso si verbose está activo"""
+        if self.verbose:
+            print(message)
     
     def _format_data_block(
         self,
         paciente_registrado: bool,
         nombre: str = None,
-        citas: List[Dict] = None,
+        fecha: str = None,
+        hora: str = None,
+        estado: str = None,
         ultima_visita: str = None
     ) -> str:
-        """Formatea el bloque <DATA>"""
-        data_lines = []
-        data_lines.append("Paciente_registrado = " + ("True" if paciente_registrado else "False"))
-        data_lines.append("Nombre = " + (f'"{nombre}"' if nombre else "None"))
-        
-        if citas:
-            citas_str = "["
-            for i, cita in enumerate(citas):
-                citas_str += f'{{fecha: "{cita["fecha"]}", hora: "{cita["hora"]}", estado: "{cita["estado"]}"}}'
-                if i < len(citas) - 1:
-                    citas_str += ", "
-            citas_str += "]"
-            data_lines.append(f"Citas = {citas_str}")
-        else:
-            data_lines.append("Citas = []")
-        
-        data_lines.append("Ultima_visita = " + (f'"{ultima_visita}"' if ultima_visita else "None"))
+        """
+        Formatea el bloque <DATA>
         
-        return "\n".join(data_lines)
+        Los ejemplos tienen a lo sumo una cita, por lo que se recibe
+        directamente (fecha, hora, estado) en lugar de una lista de dicts.
+        """
+        if fecha:
+            citas_str = "[" + _CITA_TMPL % (fecha, hora, estado) + "]"
+        else:
+            citas_str = "[]"
+        
+        nombre_str = self._nombre_data.get(nombre)
+        if nombre_str is None:
+            nombre_str = f'"{nombre}"' if nombre else "None"
+        
+        return _DATA_TMPL % (
+            paciente_registrado,
+            nombre_str,
+            citas_str,
+            f'"{ultima_visita}"' if ultima_visita else "None"
+        )
     
     def _create_prompt(self, data_block: str, user_message: str) -> str:
         """Crea el prompt completo"""
-        prompt = f"<SYS>\n{self.system_prompt}\n</SYS>\n\n"
-        prompt += f"<DATA>\n{data_block}\n</DATA>\n\n"
-        prompt += f"<USER>: {user_message}\n<ASSISTANT>:"
-        return prompt
+        return (
+            self._prompt_prefix + data_block
+            + self._prompt_mid + user_message
+            + self._prompt_suffix
+        )
+    
+    def _generate_random_dates(self, num: int, days_ahead: int = 30) -> List[str]:
+        """Genera `num` fechas aleatorias futuras (YYYY-MM-DD) con un solo date.today()"""
+        # Solo hay days_ahead fechas posibles: se formatean una vez y se sortean
+        hoy = date.today()
+        pool = [(hoy + timedelta(days=d)).isoformat() for d in range(1, days_ahead + 1)]
+        return random.choices(pool, k=num)
+    
+    def _generate_random_past_dates(self, num: int, days_ago: int = 90) -> List[str]:
+        """Genera `num` fechas aleatorias pasadas (YYYY-MM-DD) con un solo date.today()"""
+        hoy = date.today()
+        pool = [(hoy - timedelta(days=d)).isoformat() for d in range(1, days_ago + 1)]
+        return random.choices(pool, k=num)
     
     def _generate_random_date(self, days_ahead: int = 30) -> str:
         """Genera fecha aleatoria futura"""
-        fecha = datetime.now() + timedelta(days=random.randint(1, days_ahead))
-        return fecha.strftime("%Y-%m-%d")
+        return self._generate_random_dates(1, days_ahead)[0]
     
     def _generate_random_past_date(self, days_ago: int = 90) -> str:
         """Genera fecha aleatoria pasada"""
-        fecha = datetime.now() - timedelta(days=random.randint(1, days_ago))
-        return fecha.strftime("%Y-%m-%d")
+        return self._generate_random_past_dates(1, days_ago)[0]
+    
+    @staticmethod
+    def _first_sentences(text: str) -> List[str]:
+        """
+        Divide el texto en oraciones recorriéndolo una sola vez.
+        
+        Una oración termina en . ! ? seguido de espacios y una mayúscula
+        (o ¿ ¡). Como solo interesan las 2 primeras, el recorrido se detiene
+        al encontrar la tercera y el resto se devuelve como un único tramo.
+        
+        Returns:
+            Hasta 3 oraciones no vacías, sin espacios en los extremos
+        """
+        sentences = []
+        start = 0
+        i = 0
+        n = len(text)
+        while i < n and len(sentences) < 2:
+            if text[i] in '.!?':
+                j = i + 1
+                while j < n and text[j].isspace():
+                    j += 1
+                if j > i + 1 and j < n and text[j] in _SENT_START:
+                    sentences.append(text[start:i + 1].strip())
+                    start = i = j
+                    continue
+            i += 1
+        
+        rest = text[start:].strip()
+        if rest:
+            sentences.append(rest)
+        return [s for s in sentences if s]
     
-    def _add_example(self, prompt: str, completion: str):
-        """Agrega ejemplo al dataset"""
-        self.dataset.append({
-            "prompt": prompt,
-            "completion": f" {completion}"
-        })
-
     def _clean_completion(self, text: str) -> str:
         """
         Limpia y trunca el completion a maximo 2 oraciones.
@@ -348,18 +449,27 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
             Completion limpio y corto
         """
 
-        import re
+        # 0. Camino rápido: casi todos los completions de las plantillas ya
+        #    cumplen las condiciones y la limpieza no los cambiaría.
+        #    isprintable() descarta saltos de línea, tabs y otros espacios raros;
+        #    con a lo sumo un ". ", "! " o "? " hay como máximo 2 oraciones.
+        if (
+            text
+            and len(text) <= 200
+            and text[-1] in '.!?'
+            and text[0] != ' '
+            and text.isprintable()
+            and '  ' not in text
+            and text.count('. ') + text.count('! ') + text.count('? ') <= 1
+        ):
+            return text
 
         # 1. Remover saltos de línea dobles
         text = text.replace('\n\n', '. ')
         text = text.replace('\n', ' ')
         
         # 2. Dividir en oraciones (por punto + espacio + mayúscula)
-        # Patrón: . seguido de espacio y letra mayúscula
-        sentences = re.split(r'(?<=[.!?])\s+(?=[A-ZÁÉÍÓÚÑ¿¡])', text)
-        
-        # Limpiar oraciones vacías
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = self._first_sentences(text)
         
         # 3. Tomar solo las primeras 2 oraciones
         if len(sentences) > 2:
@@ -389,232 +499,293 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
         
         return text.strip()
     
-    def generate_saludos_con_cita(self, num: int):
+    def _iter_saludos_con_cita(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera ejemplos de saludos con cita programada"""
-        print(f"🔄 Generando {num} ejemplos: Saludos con cita...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            saludo_user = random.choice(self.saludos_user)
+        self._log(f"🔄 Generando {num} ejemplos: Saludos con cita...")
+        nombres = self._pick(self.nombres, num)
+        saludos = self._pick(self.saludos_user, num)
+        horas = self._pick(self.horarios, num)
+        estados = self._pick(self.estados_cita, num)
+        templates = self._pick(self.saludos_assistant_templates, num)
+        fechas = self._generate_random_dates(num, 30)
+        visitas = self._generate_random_past_dates(num, 60)
+        con_visita = self._flips(num, 0.7)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        primer_nombre = self.primer_nombre
+        for k in range(num):
+            nombre = nombres[k]
+            saludo_user = saludos[k]
             
             # Cita aleatoria
-            fecha_cita = self._generate_random_date(30)
-            hora_cita = random.choice(self.horarios)
-            estado_cita = random.choice(self.estados_cita)
-            
-            citas = [{
-                "fecha": fecha_cita,
-                "hora": hora_cita,
-                "estado": estado_cita
-            }]
+            fecha_cita = fechas[k]
+            hora_cita = horas[k]
+            estado_cita = estados[k]
             
-            ultima_visita = self._generate_random_past_date(60) if random.random() > 0.3 else None
+            ultima_visita = visitas[k] if con_visita[k] else None
             
-            data_block = self._format_data_block(
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=citas,
+                fecha=fecha_cita,
+                hora=hora_cita,
+                estado=estado_cita,
                 ultima_visita=ultima_visita
             )
             
-            prompt = self._create_prompt(data_block, saludo_user)
+            prompt = mkprompt(data_block, saludo_user)
             
             # Respuesta con recordatorio de cita
-            completion = random.choice(self.saludos_assistant_templates).format(nombre=nombre.split()[0])
+            completion = templates[k].format(nombre=primer_nombre[nombre])
             completion += f" Te recuerdo que tienes cita el {fecha_cita} a las {hora_cita}."
             
             # LIMPIAR COMPLETION ANTES DE AGREGAR
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
             
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_saludos_sin_cita(self, num: int):
+    def _iter_saludos_sin_cita(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera ejemplos de saludos sin cita"""
-        print(f"🔄 Generando {num} ejemplos: Saludos sin cita...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            saludo_user = random.choice(self.saludos_user)
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Saludos sin cita...")
+        nombres = self._pick(self.nombres, num)
+        saludos = self._pick(self.saludos_user, num)
+        templates = self._pick(self.saludos_assistant_templates, num)
+        visitas = self._generate_random_past_dates(num, 90)
+        con_visita = self._flips(num, 0.5)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        primer_nombre = self.primer_nombre
+        for k in range(num):
+            nombre = nombres[k]
+            saludo_user = saludos[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
-                ultima_visita=self._generate_random_past_date(90) if random.random() > 0.5 else None
+                ultima_visita=visitas[k] if con_visita[k] else None
             )
             
-            prompt = self._create_prompt(data_block, saludo_user)
-            completion = random.choice(self.saludos_assistant_templates).format(nombre=nombre.split()[0])
+            prompt = mkprompt(data_block, saludo_user)
+            completion = templates[k].format(nombre=primer_nombre[nombre])
             
             # LIMPIAR COMPLETION
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
             
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_consultas_cita_con_datos(self, num: int):
+    def _iter_consultas_cita_con_datos(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera consultas sobre citas cuando SÍ hay cita"""
-        print(f"🔄 Generando {num} ejemplos: Consultas de cita CON datos...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            pregunta = random.choice(self.preguntas_citas)
-            
-            fecha_cita = self._generate_random_date(45)
-            hora_cita = random.choice(self.horarios)
-            
-            citas = [{
-                "fecha": fecha_cita,
-                "hora": hora_cita,
-                "estado": random.choice(self.estados_cita)
-            }]
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Consultas de cita CON datos...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_citas, num)
+        horas = self._pick(self.horarios, num)
+        estados = self._pick(self.estados_cita, num)
+        templates = self._pick(self.respuestas_con_cita_templates, num)
+        fechas = self._generate_random_dates(num, 45)
+        visitas = self._generate_random_past_dates(num)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            pregunta = preguntas[k]
+            
+            fecha_cita = fechas[k]
+            hora_cita = horas[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=citas,
-                ultima_visita=self._generate_random_past_date()
+                fecha=fecha_cita,
+                hora=hora_cita,
+                estado=estados[k],
+                ultima_visita=visitas[k]
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_con_cita_templates).format(
+            prompt = mkprompt(data_block, pregunta)
+            completion = templates[k].format(
                 fecha=fecha_cita,
                 hora=hora_cita
             )
 
             # LIMPIAR COMPLETION
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
 
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_consultas_cita_sin_datos(self, num: int):
+    def _iter_consultas_cita_sin_datos(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera consultas sobre citas cuando NO hay cita"""
-        print(f"🔄 Generando {num} ejemplos: Consultas de cita SIN datos...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            pregunta = random.choice(self.preguntas_citas)
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Consultas de cita SIN datos...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_citas, num)
+        respuestas = self._pick(self.respuestas_sin_cita, num)
+        visitas = self._generate_random_past_dates(num)
+        con_visita = self._flips(num, 0.7)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            pregunta = preguntas[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
-                ultima_visita=self._generate_random_past_date() if random.random() > 0.3 else None
+                ultima_visita=visitas[k] if con_visita[k] else None
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_sin_cita)
+            prompt = mkprompt(data_block, pregunta)
+            completion = respuestas[k]
 
             # ✅ LIMPIAR COMPLETION
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
 
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_paciente_no_registrado(self, num: int):
+    def _iter_paciente_no_registrado(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera ejemplos de pacientes NO registrados"""
-        print(f"🔄 Generando {num} ejemplos: Pacientes NO registrados...")
-        for _ in range(num):
-            pregunta = random.choice(self.preguntas_citas + self.saludos_user)
-            
-            data_block = self._format_data_block(
-                paciente_registrado=False,
-                nombre=None,
-                citas=None,
-                ultima_visita=None
-            )
-            
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = "No encuentro tu información en el sistema. Por favor comunícate con el centro de salud."
-            
-            completion = self._clean_completion(completion)
-
-            self._add_example(prompt, completion)
+        self._log(f"🔄 Generando {num} ejemplos: Pacientes NO registrados...")
+        preguntas = self._pick(self.preguntas_citas + self.saludos_user, num)
+        
+        # El bloque <DATA> y la respuesta son siempre iguales: se arman una vez,
+        # y cada pregunta distinta tiene un único prompt que comparten todos
+        # sus ejemplos (mismo objeto str en lugar de una copia por ejemplo)
+        data_block = self._format_data_block(
+            paciente_registrado=False,
+            nombre=None,
+            ultima_visita=None
+        )
+        completion = " " + self._clean_completion(
+            "No encuentro tu información en el sistema. Por favor comunícate con el centro de salud."
+        )
+        prompts = {pregunta: self._create_prompt(data_block, pregunta) for pregunta in set(preguntas)}
+        
+        for k in range(num):
+            yield prompts[preguntas[k]], completion
     
-    def generate_preguntas_sintomas(self, num: int):
+    def _iter_preguntas_sintomas(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera preguntas sobre síntomas de TB"""
-        print(f"🔄 Generando {num} ejemplos: Preguntas sobre síntomas...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            pregunta = random.choice(self.preguntas_sintomas)
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Preguntas sobre síntomas...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_sintomas, num)
+        respuestas = self._pick(self.respuestas_sintomas, num)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            pregunta = preguntas[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
                 ultima_visita=None
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_sintomas)
+            prompt = mkprompt(data_block, pregunta)
+            completion = respuestas[k]
             
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
 
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_preguntas_tratamiento(self, num: int):
+    def _iter_preguntas_tratamiento(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera preguntas sobre tratamiento"""
-        print(f"🔄 Generando {num} ejemplos: Preguntas sobre tratamiento...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            pregunta = random.choice(self.preguntas_tratamiento)
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Preguntas sobre tratamiento...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_tratamiento, num)
+        respuestas = self._pick(self.respuestas_tratamiento, num)
+        visitas = self._generate_random_past_dates(num)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            pregunta = preguntas[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
-                ultima_visita=self._generate_random_past_date()
+                ultima_visita=visitas[k]
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_tratamiento)
+            prompt = mkprompt(data_block, pregunta)
+            completion = respuestas[k]
 
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
             
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_preguntas_medicacion(self, num: int):
+    def _iter_preguntas_medicacion(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera preguntas sobre medicación"""
-        print(f"🔄 Generando {num} ejemplos: Preguntas sobre medicación...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            pregunta = random.choice(self.preguntas_medicacion)
-            
-            data_block = self._format_data_block(
+        self._log(f"🔄 Generando {num} ejemplos: Preguntas sobre medicación...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_medicacion, num)
+        respuestas = self._pick(self.respuestas_medicacion, num)
+        visitas = self._generate_random_past_dates(num)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            pregunta = preguntas[k]
+            
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
-                ultima_visita=self._generate_random_past_date()
+                ultima_visita=visitas[k]
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_medicacion)
+            prompt = mkprompt(data_block, pregunta)
+            completion = respuestas[k]
 
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
             
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_preguntas_off_topic(self, num: int):
+    def _iter_preguntas_off_topic(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera preguntas fuera de contexto"""
-        print(f"🔄 Generando {num} ejemplos: Preguntas OFF-TOPIC...")
-        for _ in range(num):
-            nombre = random.choice(self.nombres) if random.random() > 0.3 else None
-            pregunta = random.choice(self.preguntas_off_topic)
+        self._log(f"🔄 Generando {num} ejemplos: Preguntas OFF-TOPIC...")
+        nombres = self._pick(self.nombres, num)
+        preguntas = self._pick(self.preguntas_off_topic, num)
+        respuestas = self._pick(self.respuestas_off_topic, num)
+        registrados = self._flips(num, 0.7)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k] if registrados[k] else None
+            pregunta = preguntas[k]
             
             paciente_registrado = nombre is not None
             
-            data_block = self._format_data_block(
+            data_block = fmt(
                 paciente_registrado=paciente_registrado,
                 nombre=nombre,
-                citas=[],
                 ultima_visita=None
             )
             
-            prompt = self._create_prompt(data_block, pregunta)
-            completion = random.choice(self.respuestas_off_topic)
+            prompt = mkprompt(data_block, pregunta)
+            completion = respuestas[k]
 
             # LIMPIAR COMPLETION
-            completion = self._clean_completion(completion)
+            completion = clean(completion)
 
-            self._add_example(prompt, completion)
+            yield prompt, f" {completion}"
     
-    def generate_conversation_with_history(self, num: int):
+    def _iter_conversation_with_history(self, num: int) -> Iterator[Tuple[str, str]]:
         """ Genera ejemplos Con historial conversacional """
-        print(f"Generando {num} ejemplos: Conversaciones con historial")
+        self._log(f"Generando {num} ejemplos: Conversaciones con historial")
 
         for _ in range(num):
             nombre = random.choice(self.nombres)
@@ -624,7 +795,9 @@ Si preguntan algo fuera de Tuberculosis, responde: "Lo siento, solo atiendo cons
             data_block = self._format_data_block(
                 paciente_registrado = True,
                 nombre = nombre,
-                citas = [{"fecha": fecha, "hora": hora, "estado": "Reprogramado"}]
+                fecha = fecha,
+                hora = hora,
+                estado = "Reprogramado"
             )
 
             history = """<HISTORY>
@@ -649,11 +822,11 @@ Eres un asistente virtual especializado SOLO en Tuberculosis...
         
         completion = "Si, ¿para qué fecha deseas reprogramarla?"
 
-        self._add_example(prompt, completion)
+        yield prompt, f" {completion}"
 
-    def generate_agendamiento_citas(self, num: int):
+    def _iter_agendamiento_citas(self, num: int) -> Iterator[Tuple[str, str]]:
         """Genera ejemplos de solicitudes de agendamiento"""
-        print(f"🔄 Generando {num} ejemplos: Agendamiento de citas...")
+        self._log(f"🔄 Generando {num} ejemplos: Agendamiento de citas...")
         
         mensajes_agendar = [
             "Quiero agendar una cita",
@@ -666,77 +839,145 @@ Eres un asistente virtual especializado SOLO en Tuberculosis...
             "Programar cita para la proxima semana"
         ]
 
-        for _ in range(num):
-            nombre = random.choice(self.nombres)
-            mensaje = random.choice(mensajes_agendar)
-
-            data_block = self._format_data_block(
+        nombres = self._pick(self.nombres, num)
+        mensajes = self._pick(mensajes_agendar, num)
+        visitas = self._generate_random_past_dates(num)
+        # Atajos locales: evitan buscar el atributo en cada iteración
+        fmt = self._format_data_block
+        mkprompt = self._create_prompt
+        clean = self._clean_completion
+        for k in range(num):
+            nombre = nombres[k]
+            mensaje = mensajes[k]
+
+            data_block = fmt(
                 paciente_registrado=True,
                 nombre=nombre,
-                citas=[],
-                ultima_visita=self._generate_random_past_date()
+                ultima_visita=visitas[k]
             )
 
-            prompt = self._create_prompt(data_block, mensaje)
+            prompt = mkprompt(data_block, mensaje)
             completion = "¡Perfecto! Te ayudo a agendar tu cita. ¿Para qué día y hora la prefieres?"
 
-            completion = self._clean_completion(completion)
-            self._add_example(prompt, completion)
+            completion = clean(completion)
+            yield prompt, f" {completion}"
 
 
     def generate_all(self):
         """Genera TODOS los ejemplos balanceados"""
-        print(f"\n{'='*70}")
-        print(f"🚀 GENERANDO {self.num_ejemplos} EJEMPLOS ESTRUCTURADOS")
-        print(f"{'='*70}\n")
-        
-        # Distribución balanceada de ejemplos
-        distribucion = {
-            "saludos_con_cita": int(self.num_ejemplos * 0.12),      # 12%
-            "saludos_sin_cita": int(self.num_ejemplos * 0.10),      # 10%
-            "consultas_cita_con_datos": int(self.num_ejemplos * 0.18),  # 18%
-            "consultas_cita_sin_datos": int(self.num_ejemplos * 0.15),  # 15%
-            "paciente_no_registrado": int(self.num_ejemplos * 0.10),    # 10%
-            "preguntas_sintomas": int(self.num_ejemplos * 0.15),        # 15%
-            "preguntas_tratamiento": int(self.num_ejemplos * 0.10),     # 10%
-            "preguntas_medicacion": int(self.num_ejemplos * 0.07),      # 7%
-            "preguntas_off_topic": int(self.num_ejemplos * 0.03)        # 3%
-        }
-        
-        # Generar cada tipo
-        self.generate_saludos_con_cita(distribucion["saludos_con_cita"])
-        self.generate_saludos_sin_cita(distribucion["saludos_sin_cita"])
-        self.generate_consultas_cita_con_datos(distribucion["consultas_cita_con_datos"])
-        self.generate_consultas_cita_sin_datos(distribucion["consultas_cita_sin_datos"])
-        self.generate_paciente_no_registrado(distribucion["paciente_no_registrado"])
-        self.generate_preguntas_sintomas(distribucion["preguntas_sintomas"])
-        self.generate_preguntas_tratamiento(distribucion["preguntas_tratamiento"])
-        self.generate_preguntas_medicacion(distribucion["preguntas_medicacion"])
-        self.generate_preguntas_off_topic(distribucion["preguntas_off_topic"])
-        
-        # Mezclar dataset
-        random.shuffle(self.dataset)
-        
-        print(f"\n{'='*70}")
-        print(f"✅ TOTAL GENERADO: {len(self.dataset)} ejemplos")
-        print(f"{'='*70}\n")
+        # La distribución suma exactamente num_ejemplos: se reserva la lista
+        # de una vez y se llena por índice (extend de un generador la haría
+        # crecer de a poco, sin conocer el largo)
+        # Solo se crean tuplas y strings sin ciclos, así que el recolector
+        # cíclico no tiene nada que liberar mientras la lista crece: se pausa
+        start = len(self.dataset)
+        self.dataset.extend([None] * self.num_ejemplos)
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i, example in enumerate(self.iter_all(), start):
+                self.dataset[i] = example
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        
+        self._log(f"\n{'='*70}")
+        self._log(f"✅ TOTAL GENERADO: {len(self.dataset)} ejemplos")
+        self._log(f"{'='*70}\n")
     
-    def save(self, filename: str = "tuberculosis_structured_large.json"):
-        """Guarda el dataset en archivo JSON"""
-        output_path = Path(__file__).parent / "datasets" / filename
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+    def iter_all(self) -> Iterator[Tuple[str, str]]:
+        """
+        Genera TODOS los ejemplos balanceados y los entrega uno a uno.
+        
+        A diferencia de generate_all, no arma ninguna lista de ejemplos: cada
+        uno se construye al tomarlo de su cola y, pasándolo a save(), se
+        escribe enseguida, así que la memoria no crece con num_ejemplos.
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.dataset, f, ensure_ascii=False, indent=2)
+        Returns:
+            Iterador de ejemplos (prompt, completion) ya mezclados
+        """
+        self._log(f"\n{'='*70}")
+        self._log(f"🚀 GENERANDO {self.num_ejemplos} EJEMPLOS ESTRUCTURADOS")
+        self._log(f"{'='*70}\n")
+        
+        # Distribución balanceada de ejemplos (proporciones que suman 1)
+        tipos = (
+            "saludos_con_cita",           # 12%
+            "saludos_sin_cita",           # 10%
+            "consultas_cita_con_datos",   # 18%
+            "consultas_cita_sin_datos",   # 15%
+            "paciente_no_registrado",     # 10%
+            "preguntas_sintomas",         # 15%
+            "preguntas_tratamiento",      # 10%
+            "preguntas_medicacion",       # 7%
+            "preguntas_off_topic",        # 3%
+        )
+        ratios = (0.12, 0.10, 0.18, 0.15, 0.10, 0.15, 0.10, 0.07, 0.03)
+        cantidades = [int(self.num_ejemplos * r) for r in ratios]
+        # El redondeo hacia abajo pierde ejemplos: la última categoría
+        # absorbe el resto para que el total sea exactamente num_ejemplos
+        cantidades[-1] += self.num_ejemplos - sum(cantidades)
+        distribucion = dict(zip(tipos, cantidades))
+        
+        # Cada tipo es un generador que hace de cola para la mezcla: arma un
+        # ejemplo recién cuando se lo pide, así que nunca hay más de uno vivo
+        # por tipo (solo las elecciones al azar de cada tipo son listas)
+        colas = [getattr(self, f"_iter_{tipo}")(num) for tipo, num in distribucion.items()]
+        
+        # Mezclar dataset: dentro de cada tipo los ejemplos ya salen en orden
+        # aleatorio, así que basta mezclar a qué tipo corresponde cada posición
+        # (enteros pequeños) y tomar el siguiente ejemplo de esa cola
+        tags = [idx for idx, num in enumerate(cantidades) for _ in range(num)]
+        random.shuffle(tags)
+        for idx in tags:
+            yield next(colas[idx])
+    
+    def save(
+        self,
+        filename: str = "tuberculosis_structured_large.json",
+        examples: Optional[Iterable[Tuple[str, str]]] = None
+    ):
+        """
+        Guarda el dataset en archivo JSON
         
-        print(f"💾 Dataset guardado en: {output_path}")
-        print(f"📊 Total de ejemplos: {len(self.dataset)}")
+        Args:
+            filename: Nombre del archivo dentro de la carpeta datasets
+            examples: Ejemplos a guardar (ej: iter_all()); por defecto self.dataset
+        """
+        if examples is None:
+            examples = self.dataset
+        output_path = _DATASETS_DIR / filename
+        _DATASETS_DIR.mkdir(parents=True, exist_ok=True)
+        
+        # Un ejemplo por línea dentro del arreglo JSON: se escribe en streaming
+        # sin armar la versión indentada de todo el dataset en memoria.
+        # En modo binario write() devuelve los bytes escritos, así el tamaño
+        # del archivo se conoce sin hacer stat() después.
+        # Las estadísticas se acumulan al escribir, sin volver a recorrer los ejemplos.
+        written = 0
+        total = 0
+        prompt_chars = 0
+        completion_chars = 0
+        # (buffer de 1 MiB: cada ejemplo son varios write() pequeños)
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            written += f.write(b'[')
+            for prompt, completion in examples:
+                written += f.write(b'\n' if total == 0 else b',\n')
+                written += f.write(_dumps({"prompt": prompt, "completion": completion}))
+                total += 1
+                prompt_chars += len(prompt)
+                completion_chars += len(completion)
+            written += f.write(b'\n]\n')
+        
+        self._log(f"💾 Dataset guardado en: {output_path}")
+        self._log(f"📊 Total de ejemplos: {total}")
         
         # Estadísticas
-        print(f"\n📈 ESTADÍSTICAS:")
-        print(f"   - Tamaño del archivo: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
-        print(f"   - Promedio longitud prompt: {sum(len(e['prompt']) for e in self.dataset) / len(self.dataset):.0f} chars")
-        print(f"   - Promedio longitud completion: {sum(len(e['completion']) for e in self.dataset) / len(self.dataset):.0f} chars")
+        total = max(total, 1)
+        self._log(f"\n📈 ESTADÍSTICAS:")
+        self._log(f"   - Tamaño del archivo: {written / 1024 / 1024:.2f} MB")
+        self._log(f"   - Promedio longitud prompt: {prompt_chars / total:.0f} chars")
+        self._log(f"   - Promedio longitud completion: {completion_chars / total:.0f} chars")
 
 
 def main():
@@ -764,9 +1005,12 @@ def main():
     print(f"\n🎯 Configurado para generar: {num_ejemplos} ejemplos\n")
     
     # Generar dataset
+    # (en streaming: los ejemplos se escriben a medida que se mezclan)
     generator = LargeStructuredDatasetGenerator(num_ejemplos=num_ejemplos)
-    generator.generate_all()
-    generator.save(filename=f"tuberculosis_structured_{num_ejemplos}.json")
+    generator.save(
+        filename=f"tuberculosis_structured_{num_ejemplos}.json",
+        examples=generator.iter_all()
+    )
     
     print(f"\n✅ ¡LISTO! Dataset masivo generado exitosamente")
     print(f"\n📝 SIGUIENTE PASO:")
@@ -25,12 +25,73 @@ Ultima_visita = "2025-10-10" o None
 <ASSISTANT>: respuesta basada SOLO en <DATA>
 """
 
+import argparse
 import json
 import random
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
+try:
+    # Serializador JSON en C; escribe bytes UTF-8 sin escapar por defecto
+    import orjson
+
+    def _write_json(path: Path, obj, pretty: bool = False) -> None:
+        """Escribe obj como JSON (compacto, o indentado si pretty) con orjson."""
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else None))
+except ImportError:
+    def _write_json(path: Path, obj, pretty: bool = False) -> None:
+        """
+        Escribe obj como JSON (UTF-8 sin escapar) con la librería estándar.
+        
+        iterencode entrega el JSON por partes, así se escribe al archivo
+        sin construir antes el string completo del dataset.
+        Compacto por defecto; con pretty se indenta para revisarlo a mano.
+        """
+        if pretty:
+            encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+        else:
+            encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in encoder.iterencode(obj):
+                f.write(chunk)
+
+
+def _format_citas(citas: Tuple[Tuple[str, str, str], ...]) -> str:
+    """Formatea la lista de citas en una sola pasada con join (o "[]" si no hay)"""
+    return "[" + ", ".join(
+        f'{{fecha: "{fecha}", hora: "{hora}", estado: "{estado}"}}'
+        for fecha, hora, estado in citas
+    ) + "]"
+
+
+@lru_cache(maxsize=4096)
+def _format_data_block(
+    paciente_registrado: bool,
+    nombre: Optional[str],
+    citas: Tuple[Tuple[str, str, str], ...],
+    ultima_visita: Optional[str]
+) -> str:
+    """
+    Arma el bloque <DATA> (con caché: los generadores repiten las mismas combinaciones).
+    
+    Args:
+        paciente_registrado: Si el paciente está en la BD
+        nombre: Nombre del paciente o None
+        citas: Tupla de citas (fecha, hora, estado)
+        ultima_visita: Fecha de última visita o None
+    
+    Returns:
+        String formateado para <DATA>
+    """
+    return "\n".join((
+        "Paciente_registrado = " + ("True" if paciente_registrado else "False"),
+        "Nombre = " + (f'"{nombre}"' if nombre else "None"),
+        "Citas = " + _format_citas(citas),
+        "Ultima_visita = " + (f'"{ultima_visita}"' if ultima_visita else "None"),
+    ))
+
 
 class StructuredDatasetGenerator:
     """
@@ -45,12 +106,23 @@ SI NO hay datos explícitos, debes responder: "No tengo esa información registr
 NUNCA inventes nombres, fechas o información que no esté en <DATA>.
 Máximo 2 oraciones por respuesta."""
         
+        # Partes fijas del prompt, armadas una sola vez (el system prompt no cambia)
+        self._prompt_prefix = f"<SYS>\n{self.system_prompt}\n</SYS>\n\n<DATA>\n"
+        self._prompt_mid = "\n</DATA>\n\n<USER>: "
+        self._prompt_suffix = "\n<ASSISTANT>:"
+        
         # Nombres reales para ejemplos
         self.nombres = [
             "Juan Pérez", "María García", "Carlos López", "Ana Martínez",
             "Pedro Rodríguez", "Laura Fernández", "Diego González", "Sofía Torres",
             "Taison Perez", "Roberto Silva", "Valentina Cruz", "Jorge Morales"
         ]
+        # Primer nombre de cada paciente (paralelo a self.nombres), calculado una sola vez
+        self.primer_nombres = [n.partition(" ")[0] for n in self.nombres]
+        
+        # Fechas futuras de 1 a 7 días desde hoy (YYYY-MM-DD), calculadas una sola vez
+        hoy = date.today()
+        self.fechas_futuras = [(hoy + timedelta(days=d)).isoformat() for d in range(1, 8)]
         
         self.dataset = []
     
@@ -73,24 +145,9 @@ Máximo 2 oraciones por respuesta."""
         Returns:
             String formateado para <DATA>
         """
-        data_lines = []
-        data_lines.append("Paciente_registrado = " + ("True" if paciente_registrado else "False"))
-        data_lines.append("Nombre = " + (f'"{nombre}"' if nombre else "None"))
-        
-        if citas:
-            citas_str = "["
-            for i, cita in enumerate(citas):
-                citas_str += f'{{fecha: "{cita["fecha"]}", hora: "{cita["hora"]}", estado: "{cita["estado"]}"}}'
-                if i < len(citas) - 1:
-                    citas_str += ", "
-            citas_str += "]"
-            data_lines.append(f"Citas = {citas_str}")
-        else:
-            data_lines.append("Citas = []")
-        
-        data_lines.append("Ultima_visita = " + (f'"{ultima_visita}"' if ultima_visita else "None"))
-        
-        return "\n".join(data_lines)
+        # None y [] quedan como la misma tupla vacía (misma clave de caché)
+        citas_key = tuple((c["fecha"], c["hora"], c["estado"]) for c in citas) if citas else ()
+        return _format_data_block(paciente_registrado, nombre, citas_key, ultima_visita)
     
     def _create_prompt(self, data_block: str, user_message: str) -> str:
         """
@@ -103,16 +160,11 @@ Máximo 2 oraciones por respuesta."""
         Returns:
             Prompt completo
         """
-        return f"""<SYS>
-{self.system_prompt}
-</SYS>
-
-<DATA>
-{data_block}
-</DATA>
-
-<USER>: {user_message}
-<ASSISTANT>:"""
+        return (
+            self._prompt_prefix + data_block
+            + self._prompt_mid + user_message
+            + self._prompt_suffix
+        )
     
     def generate_greetings_with_patient_data(self):
         """
@@ -121,7 +173,10 @@ Máximo 2 oraciones por respuesta."""
         """
         print("📝 Generando saludos con datos de pacientes...")
         
-        for nombre in self.nombres[:8]:  # 8 ejemplos
+        # Atajos locales para el loop
+        choice = random.choice
+        fechas_futuras = self.fechas_futuras
+        for nombre, primer_nombre in zip(self.nombres[:8], self.primer_nombres):  # 8 ejemplos
             # Caso 1: Paciente registrado SIN citas
             data_block = self._format_data_block(
                 paciente_registrado=True,
@@ -131,7 +186,7 @@ Máximo 2 oraciones por respuesta."""
             )
             
             prompt = self._create_prompt(data_block, "Hola")
-            completion = f" ¡Hola {nombre.split()[0]}! ¿Cómo te sientes hoy? Veo que no tienes citas programadas."
+            completion = f" ¡Hola {primer_nombre}! ¿Cómo te sientes hoy? Veo que no tienes citas programadas."
             
             self.dataset.append({
                 "prompt": prompt,
@@ -139,7 +194,7 @@ Máximo 2 oraciones por respuesta."""
             })
             
             # Caso 2: Paciente registrado CON cita
-            fecha_futura = (datetime.now() + timedelta(days=random.randint(1, 7))).strftime("%Y-%m-%d")
+            fecha_futura = choice(fechas_futuras)
             data_block = self._format_data_block(
                 paciente_registrado=True,
                 nombre=nombre,
@@ -148,7 +203,7 @@ Máximo 2 oraciones por respuesta."""
             )
             
             prompt = self._create_prompt(data_block, "Buenos días")
-            completion = f" ¡Buenos días {nombre.split()[0]}! Te recuerdo que tienes cita el {fecha_futura} a las 10:00."
+            completion = f" ¡Buenos días {primer_nombre}! Te recuerdo que tienes cita el {fecha_futura} a las 10:00."
             
             self.dataset.append({
                 "prompt": prompt,
@@ -164,9 +219,9 @@ Máximo 2 oraciones por respuesta."""
         """
         print("📝 Generando consultas de citas con datos...")
         
-        for nombre in self.nombres[:6]:
+        fecha_cita = self.fechas_futuras[2]  # dentro de 3 días
+        for nombre, primer_nombre in zip(self.nombres[:6], self.primer_nombres):
             # Caso 1: Tiene cita - debe leer de <DATA>
-            fecha_cita = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
             data_block = self._format_data_block(
                 paciente_registrado=True,
                 nombre=nombre,
@@ -175,7 +230,7 @@ Máximo 2 oraciones por respuesta."""
             )
             
             prompt = self._create_prompt(data_block, "¿Cuándo es mi próxima cita?")
-            completion = f" Tu próxima cita es el {fecha_cita} a las 14:00, {nombre.split()[0]}."
+            completion = f" Tu próxima cita es el {fecha_cita} a las 14:00, {primer_nombre}."
             
             self.dataset.append({
                 "prompt": prompt,
@@ -191,7 +246,7 @@ Máximo 2 oraciones por respuesta."""
             )
             
             prompt = self._create_prompt(data_block, "¿Tengo citas programadas?")
-            completion = f" No tienes citas programadas actualmente, {nombre.split()[0]}. ¿Deseas agendar una?"
+            completion = f" No tienes citas programadas actualmente, {primer_nombre}. ¿Deseas agendar una?"
             
             self.dataset.append({
                 "prompt": prompt,
@@ -273,7 +328,7 @@ Máximo 2 oraciones por respuesta."""
         """
         print("📝 Generando ejemplos de agendamiento...")
         
-        for nombre in self.nombres[:5]:
+        for nombre, primer_nombre in zip(self.nombres[:5], self.primer_nombres):
             data_block = self._format_data_block(
                 paciente_registrado=True,
                 nombre=nombre,
@@ -282,7 +337,7 @@ Máximo 2 oraciones por respuesta."""
             )
             
             prompt = self._create_prompt(data_block, "Quiero agendar una cita")
-            completion = f" Perfecto {nombre.split()[0]}, para agendar tu cita necesito que el personal médico se contacte contigo. ¿Confirmas tu número de teléfono?"
+            completion = f" Perfecto {primer_nombre}, para agendar tu cita necesito que el personal médico se contacte contigo. ¿Confirmas tu número de teléfono?"
             
             self.dataset.append({
                 "prompt": prompt,
@@ -322,12 +377,14 @@ Máximo 2 oraciones por respuesta."""
         
         print(f"✅ {len(self.dataset)} ejemplos totales")
     
-    def generate_complete_dataset(self, output_path: str = None):
+    def generate_complete_dataset(self, output_path: str = None, pretty: bool = False):
         """
         Genera el dataset completo estructurado.
         
         Args:
             output_path: Ruta donde guardar el dataset
+            pretty: Guardar el JSON indentado (por defecto compacto: el
+                entrenamiento no necesita los espacios y el archivo pesa menos)
         """
         print("=" * 80)
         print("🚀 GENERANDO DATASET ESTRUCTURADO")
@@ -355,8 +412,7 @@ Máximo 2 oraciones por respuesta."""
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(self.dataset, f, ensure_ascii=False, indent=2)
+        _write_json(output_file, self.dataset, pretty=pretty)
         
         print(f"💾 Dataset guardado en: {output_file}")
         
@@ -380,9 +436,17 @@ Máximo 2 oraciones por respuesta."""
 def main():
     """
     Genera el dataset estructurado.
+    
+    Uso:
+        python app/training/create_structured_dataset.py
+        python app/training/create_structured_dataset.py --pretty  # JSON indentado
     """
+    parser = argparse.ArgumentParser(description="Genera el dataset estructurado")
+    parser.add_argument("--pretty", action="store_true", help="Guardar el JSON indentado")
+    args = parser.parse_args()
+    
     generator = StructuredDatasetGenerator()
-    output_path = generator.generate_complete_dataset()
+    output_path = generator.generate_complete_dataset(pretty=args.pretty)
     
     print("\n" + "=" * 80)
     print("🎉 DATASET ESTRUCTURADO CREADO EXITOSAMENTE")
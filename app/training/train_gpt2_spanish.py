@@ -8,11 +8,17 @@ Diferencias con DialoGPT:
 - GPT-2 usa formato de prompt diferente
 - Tokenización específica para español
 - Mejores hiperparámetros para español
+
+Uso con varias GPUs (DDP, un proceso por GPU; los logs salen solo del rank 0):
+    torchrun --nproc_per_node=N app/training/train_gpt2_spanish.py
 """
 
 import os
 import sys
 import json
+import shutil
+import hashlib
+import math
 import torch
 import logging
 from pathlib import Path
@@ -21,12 +27,19 @@ from dataclasses import dataclass
 
 from transformers import (
     GPT2LMHeadModel,
-    GPT2Tokenizer,
+    GPT2TokenizerFast,
     Trainer,
     TrainingArguments,
-    DataCollatorForLanguageModeling
+    DataCollatorForSeq2Seq
 )
-from datasets import Dataset
+from datasets import Dataset, DatasetDict, Features, Value, load_from_disk
+from accelerate import PartialState
+
+try:
+    # Parser JSON en C (ya usado por los generadores de datasets)
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 # Configurar logging
 logging.basicConfig(
@@ -36,6 +49,44 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _conversation_texts(dataset_path: str, dataset_hash: str):
+    """
+    Genera los textos de entrenamiento a partir del archivo de conversaciones.
+    
+    Acepta un JSON con la lista completa o un JSONL (una conversación por
+    línea), que se lee de a una línea sin cargar todo el archivo.
+    
+    Args:
+        dataset_path: Ruta al JSON/JSONL con pares prompt/completion
+        dataset_hash: Hash del contenido; solo forma parte de la huella del
+            dataset, para que datasets no reutilice una caché de otro archivo
+    
+    Yields:
+        Diccionarios {"prompt": ..., "completion": ...}; el fin de texto se
+        agrega como token al tokenizar
+    """
+    with open(dataset_path, 'rb') as f:
+        if dataset_path.endswith(".jsonl"):
+            conversations = (_json_loads(line) for line in f if line.strip())
+        else:
+            conversations = _json_loads(f.read())
+        
+        # NUEVO FORMATO: prompt + completion (con contexto de sistema embebido)
+        total = 0
+        for i, conv in enumerate(conversations):
+            total += 1
+            # Validar formato
+            if "prompt" not in conv or "completion" not in conv:
+                logger.warning(f"⚠️ Conversación {i} sin formato correcto, saltando...")
+                continue
+            
+            # El prompt incluye sistema + contexto; el modelo aprenderá a
+            # predecir completion dado el prompt completo
+            yield {"prompt": conv["prompt"], "completion": conv["completion"]}
+    
+    logger.info(f"✅ Cargadas {total} conversaciones")
+
+
 @dataclass
 class TrainingConfig:
     """Configuración de entrenamiento."""
@@ -46,9 +97,22 @@ class TrainingConfig:
     num_epochs: int = 10
     batch_size: int = 4
     learning_rate: float = 3e-5
-    warmup_steps: int = 100
+    # Fracción de los pasos totales dedicada al warmup (se adapta al tamaño del dataset)
+    warmup_ratio: float = 0.03
     max_length: int = 512
+    # Mínimo de pasos entre checkpoints (se guardan ~10 por entrenamiento)
     save_steps: int = 50
+    # Recalcula activaciones en el backward: menos memoria (permite batch mayor) a cambio de ~30% más cómputo
+    gradient_checkpointing: bool = False
+    # AdamW de 8 bits (bitsandbytes): estado del optimizador 4 veces más chico
+    use_8bit_optim: bool = False
+    # torch.compile del modelo de entrenamiento (solo CUDA): kernels fusionados,
+    # a cambio de compilar al inicio y con cada largo de secuencia nuevo
+    torch_compile: bool = False
+    # LoRA (peft): entrena solo adaptadores de bajo rango en c_attn/c_proj; el resto queda congelado
+    use_lora: bool = False
+    lora_r: int = 16
+    lora_alpha: int = 32
 
 
 class MedicalGPT2Trainer:
@@ -56,13 +120,24 @@ class MedicalGPT2Trainer:
     Entrenador especializado para GPT-2 español con conversaciones médicas.
     """
     
+    # Subir cuando cambien las columnas que produce tokenize_dataset
+    _TOKENIZE_CACHE_VERSION = 4
+    
     def __init__(self, config: TrainingConfig):
         self.config = config
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # GPU de este proceso cuando se lanza con torchrun (0 si es un solo proceso)
+        self.local_rank = int(os.environ.get("LOCAL_RANK", 0))
+        # Cantidad de procesos (GPUs) que reparten cada batch global
+        self.world_size = int(os.environ.get("WORLD_SIZE", 1))
         self.model = None
         self.tokenizer = None
         self.train_dataset = None
         self.eval_dataset = None
+        # Hash del contenido del dataset (clave de la caché de tokenización)
+        self._dataset_hash = None
+        # True si el modelo quedó envuelto con adaptadores LoRA
+        self._lora_enabled = False
         
         logger.info("=" * 80)
         logger.info("🤖 FINE-TUNING GPT-2 ESPAÑOL - CONVERSACIONES MÉDICAS")
@@ -70,6 +145,11 @@ class MedicalGPT2Trainer:
         logger.info(f"🖥️  Dispositivo: {self.device}")
         
         if self.device == "cuda":
+            # TF32 en los tensor cores (Ampere+) para lo que quede en FP32
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.set_float32_matmul_precision("high")
+            
             logger.info(f"🎮 GPU: {torch.cuda.get_device_name(0)}")
             logger.info(f"💾 VRAM: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
     
@@ -91,28 +171,23 @@ class MedicalGPT2Trainer:
         else:
             logger.info(f"📂 Cargando dataset desde: {dataset_path}")
         
-        # Cargar JSON
-        with open(dataset_path, 'r', encoding='utf-8') as f:
-            conversations = json.load(f)
-        
-        logger.info(f"✅ Cargadas {len(conversations)} conversaciones")
-        
-        # Convertir a formato de texto para GPT-2
-        # NUEVO FORMATO: prompt + completion (con contexto de sistema embebido)
-        texts = []
-        for i, conv in enumerate(conversations):
-            # Validar formato
-            if "prompt" not in conv or "completion" not in conv:
-                logger.warning(f"⚠️ Conversación {i} sin formato correcto, saltando...")
-                continue
-            
-            # Combinar prompt (incluye sistema + contexto) + completion + fin
-            # El modelo aprenderá a predecir completion dado el prompt completo
-            text = f"{conv['prompt']}{conv['completion']}<|endoftext|>"
-            texts.append({"text": text})
-        
-        # Crear dataset
-        dataset = Dataset.from_list(texts)
+        # Hash del contenido: clave de la caché de tokenización y huella del
+        # dataset Arrow que arma from_generator. Se lee por bloques de 1 MiB
+        # para no cargar el archivo completo en memoria
+        digest = hashlib.sha256()
+        with open(dataset_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self._dataset_hash = digest.hexdigest()
+        
+        # Los textos se escriben en Arrow a medida que se generan, sin armar
+        # antes una lista intermedia en memoria. Con el esquema explícito las
+        # columnas se crean como string sin inferir tipos de los primeros ejemplos
+        dataset = Dataset.from_generator(
+            _conversation_texts,
+            features=Features({"prompt": Value("string"), "completion": Value("string")}),
+            gen_kwargs={"dataset_path": dataset_path, "dataset_hash": self._dataset_hash}
+        )
         
         # Split 90% train, 10% eval
         split = dataset.train_test_split(test_size=0.1, seed=42)
@@ -128,8 +203,8 @@ class MedicalGPT2Trainer:
         """
         logger.info(f"🤖 Cargando modelo base: {self.config.model_name}")
         
-        # Cargar tokenizer
-        self.tokenizer = GPT2Tokenizer.from_pretrained(self.config.model_name)
+        # Cargar tokenizer (versión rápida en Rust: tokeniza los batches en paralelo)
+        self.tokenizer = GPT2TokenizerFast.from_pretrained(self.config.model_name)
         
         # GPT-2 español necesita configuración especial de tokens
         if self.tokenizer.pad_token is None:
@@ -141,61 +216,142 @@ class MedicalGPT2Trainer:
         
         logger.info("✅ Tokenizer cargado")
         
-        # Cargar modelo
+        # Cargar modelo (pesos maestros en FP32: la precisión mixta la aplica el Trainer).
+        # Los pesos se cargan directo en el dispositivo, sin una copia completa previa en RAM
         self.model = GPT2LMHeadModel.from_pretrained(
             self.config.model_name,
-            torch_dtype=torch.float32  # FP32 para estabilidad
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True,
+            device_map={"": self.local_rank} if self.device == "cuda" else None
         )
         
         # Configurar pad_token_id en el modelo
         self.model.config.pad_token_id = self.tokenizer.pad_token_id
         
-        # Mover a GPU
-        self.model.to(self.device)
+        if self.config.gradient_checkpointing:
+            # El Trainer activa el checkpointing (ver TrainingArguments); el
+            # KV-cache no sirve al entrenar y choca con él
+            self.model.config.use_cache = False
+        
+        if self.config.use_lora:
+            self._apply_lora()
         
         logger.info(f"✅ Modelo cargado en {self.device}")
         logger.info(f"📊 Parámetros: {self.model.num_parameters():,}")
     
+    def _apply_lora(self) -> None:
+        """
+        Envuelve el modelo con adaptadores LoRA (requiere peft).
+        
+        Si peft no está instalado se sigue con fine-tuning completo.
+        """
+        try:
+            from peft import LoraConfig, TaskType, get_peft_model
+        except ImportError:
+            logger.warning("⚠️  peft no está instalado; se entrena el modelo completo")
+            return
+        
+        lora_config = LoraConfig(
+            task_type=TaskType.CAUSAL_LM,
+            r=self.config.lora_r,
+            lora_alpha=self.config.lora_alpha,
+            lora_dropout=0.05,
+            target_modules=["c_attn", "c_proj"],
+            fan_in_fan_out=True  # GPT-2 usa Conv1D (pesos transpuestos)
+        )
+        self.model = get_peft_model(self.model, lora_config)
+        self._lora_enabled = True
+        
+        trainable, total = self.model.get_nb_trainable_parameters()
+        logger.info(f"🧩 LoRA activo: {trainable:,} de {total:,} parámetros entrenables ({100 * trainable / total:.2f}%)")
+    
     def tokenize_dataset(self) -> None:
         """
         Tokeniza el dataset completo.
+        
+        El resultado se guarda en output_dir/tokenized_cache con una clave que
+        depende del contenido del dataset, el modelo y max_length; si ya existe,
+        se carga de disco en lugar de volver a tokenizar.
         """
         logger.info("🔤 Tokenizando dataset...")
         
-        def tokenize_function(examples):
-            # Tokenizar
-            model_inputs = self.tokenizer(
-                examples["text"],
-                truncation=True,
-                max_length=self.config.max_length,
-                padding="max_length",
-                return_attention_mask=True
-            )
-            
-            # Para language modeling, labels = input_ids
-            # Pero enmascaramos padding (-100 para que no contribuya a la loss)
-            model_inputs["labels"] = [
-                [
-                    token_id if token_id != self.tokenizer.pad_token_id else -100
-                    for token_id in input_ids
-                ]
-                for input_ids in model_inputs["input_ids"]
-            ]
+        cache_key = hashlib.sha256(
+            f"{self._TOKENIZE_CACHE_VERSION}|{self._dataset_hash}|"
+            f"{self.config.model_name}|{self.config.max_length}".encode("utf-8")
+        ).hexdigest()[:16]
+        cache_path = Path(self.config.output_dir) / "tokenized_cache" / cache_key
+        
+        # Con DDP (torchrun) solo el proceso principal tokeniza y guarda la
+        # caché; el resto espera y la carga de disco en lugar de repetir el map
+        with PartialState().main_process_first():
+            if cache_path.exists():
+                logger.info(f"📦 Usando tokenización en caché: {cache_path}")
+                tokenized = load_from_disk(str(cache_path))
+            else:
+                # Variables locales: la función se envía a los procesos de map
+                # y no debe arrastrar self (que ya tiene el modelo cargado)
+                tokenizer = self.tokenizer
+                max_length = self.config.max_length
+                eos_token_id = tokenizer.eos_token_id
+                
+                def tokenize_function(examples):
+                    # Prompt y completion se tokenizan por separado y se unen como
+                    # listas de ids, con el fin de texto agregado como id
+                    prompt_ids = tokenizer(examples["prompt"], add_special_tokens=False)["input_ids"]
+                    completion_ids = tokenizer(examples["completion"], add_special_tokens=False)["input_ids"]
+                    input_ids, labels = [], []
+                    for prompt, completion in zip(prompt_ids, completion_ids):
+                        # Si el prompt ya ocupa max_length no queda nada que aprender
+                        if len(prompt) >= max_length:
+                            continue
+                        target = completion + [eos_token_id]
+                        input_ids.append((prompt + target)[:max_length])
+                        # Loss solo sobre la respuesta (y el fin de texto): el prompt
+                        # del sistema se repite en todos los ejemplos
+                        labels.append(([-100] * len(prompt) + target)[:max_length])
+                    # Sin padding: el collator rellena cada batch hasta su secuencia
+                    # más larga (labels con -100)
+                    return {
+                        "input_ids": input_ids,
+                        "attention_mask": [[1] * len(ids) for ids in input_ids],
+                        "labels": labels,
+                        # Longitud en tokens, para agrupar batches de largo similar
+                        "length": [len(ids) for ids in input_ids],
+                    }
+                
+                # Un proceso por cada ~1000 ejemplos (hasta cpu_count); en datasets
+                # chicos no vale la pena levantar procesos
+                num_proc = min(os.cpu_count() or 1, len(self.train_dataset) // 1000)
+                splits = DatasetDict({"train": self.train_dataset, "eval": self.eval_dataset})
+                tokenized = splits.map(
+                    tokenize_function,
+                    batched=True,
+                    batch_size=1000,
+                    num_proc=num_proc if num_proc > 1 else None,
+                    remove_columns=["prompt", "completion"]
+                )
+                # Se escribe en un directorio temporal y se renombra: un guardado
+                # interrumpido no deja una caché a medias en cache_path
+                tmp_path = cache_path.with_name(f"{cache_key}.tmp{os.getpid()}")
+                tokenized.save_to_disk(str(tmp_path))
+                try:
+                    os.replace(tmp_path, cache_path)
+                    logger.info(f"💾 Tokenización guardada en: {cache_path}")
+                except OSError:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
             
-            return model_inputs
-        
-        # Aplicar tokenización
-        self.train_dataset = self.train_dataset.map(
-            tokenize_function,
-            batched=True,
-            remove_columns=["text"]
-        )
+        # tokenize_function descarta los ejemplos cuyo prompt ocupa max_length
+        for split, original in (("train", self.train_dataset), ("eval", self.eval_dataset)):
+            dropped = len(original) - len(tokenized[split])
+            if dropped:
+                logger.warning(
+                    f"⚠️  {split}: {dropped} de {len(original)} ejemplos "
+                    f"({dropped / len(original):.1%}) descartados: el prompt ocupa "
+                    f"max_length={self.config.max_length} tokens"
+                )
         
-        self.eval_dataset = self.eval_dataset.map(
-            tokenize_function,
-            batched=True,
-            remove_columns=["text"]
-        )
+        self.train_dataset = tokenized["train"]
+        self.eval_dataset = tokenized["eval"]
         
         # Configurar formato PyTorch
         self.train_dataset.set_format("torch")
@@ -223,37 +379,98 @@ class MedicalGPT2Trainer:
         # Crear directorio de salida
         os.makedirs(self.config.output_dir, exist_ok=True)
         
+        # Precisión mixta: BF16 si la GPU lo soporta (mismo rango que FP32, sin
+        # loss scaling); si no, FP16 con GradScaler. En CPU se queda en FP32.
+        use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+        use_fp16 = torch.cuda.is_available() and not use_bf16
+        logger.info(f"   - Precisión: {'BF16' if use_bf16 else 'FP16' if use_fp16 else 'FP32'}")
+        
+        # Optimizador: AdamW fusionado (un solo kernel CUDA para todos los parámetros)
+        # o AdamW de 8 bits si se pidió y bitsandbytes está disponible
+        if self.config.use_8bit_optim and self._bitsandbytes_available():
+            optim = "adamw_bnb_8bit"
+        elif self.device == "cuda":
+            optim = "adamw_torch_fused"
+        else:
+            optim = "adamw_torch"
+        logger.info(f"   - Optimizador: {optim}")
+        
+        # DataLoader: en GPU los batches se preparan en workers persistentes y
+        # quedan en memoria fijada (pinned), así la copia a la GPU es asíncrona
+        num_workers = min(4, os.cpu_count() or 1) if self.device == "cuda" else 0
+        
+        # Checkpoints: unos 10 por entrenamiento (y nunca más seguido que
+        # save_steps), así el guardado no compite con los pasos en datasets grandes
+        gradient_accumulation_steps = 2
+        steps_per_epoch = math.ceil(
+            len(self.train_dataset)
+            / (self.config.batch_size * gradient_accumulation_steps * self.world_size)
+        )
+        save_steps = max(self.config.save_steps, steps_per_epoch * self.config.num_epochs // 10)
+        logger.info(f"   - Checkpoint cada: {save_steps} pasos")
+        
+        torch_compile = self.config.torch_compile and self.device == "cuda"
+        if torch_compile:
+            # group_by_length + pad_to_multiple_of=8 dan a lo sumo max_length/8
+            # largos distintos; cada uno es una compilación que hay que conservar
+            torch._dynamo.config.cache_size_limit = max(
+                torch._dynamo.config.cache_size_limit, self.config.max_length // 8
+            )
+        
         # Argumentos de entrenamiento optimizados para GPT-2 español
         training_args = TrainingArguments(
             output_dir=self.config.output_dir,
             num_train_epochs=self.config.num_epochs,
             per_device_train_batch_size=self.config.batch_size,
             per_device_eval_batch_size=self.config.batch_size,
-            warmup_steps=self.config.warmup_steps,
+            warmup_ratio=self.config.warmup_ratio,
             learning_rate=self.config.learning_rate,
             weight_decay=0.01,
             max_grad_norm=1.0,
-            fp16=False,  # FP32 para estabilidad
+            bf16=use_bf16,
+            fp16=use_fp16,
+            bf16_full_eval=use_bf16,
+            optim=optim,
+            torch_compile=torch_compile,
+            gradient_checkpointing=self.config.gradient_checkpointing,
+            gradient_checkpointing_kwargs={"use_reentrant": False},
+            dataloader_pin_memory=self.device == "cuda",
+            dataloader_num_workers=num_workers,
+            dataloader_persistent_workers=num_workers > 0,
+            dataloader_prefetch_factor=4 if num_workers > 0 else None,
+            # DDP (torchrun): GPT-2 usa todos sus parámetros en cada paso, así que no
+            # hace falta buscar los no usados; el Trainer ya evita el all-reduce en
+            # los micro-pasos de gradient_accumulation_steps (no_sync)
+            ddp_find_unused_parameters=False,
+            ddp_bucket_cap_mb=50,
             logging_dir=f"{self.config.output_dir}/logs",
             logging_steps=10,
-            save_steps=self.config.save_steps,
-            eval_steps=self.config.save_steps,
+            save_strategy="steps",
+            save_steps=save_steps,
+            save_safetensors=True,
+            eval_steps=save_steps,
             eval_strategy="steps",
             save_total_limit=3,
             load_best_model_at_end=True,
             metric_for_best_model="eval_loss",
             greater_is_better=False,
             report_to="none",
-            remove_unused_columns=False,
+            # Batches con ejemplos de largo similar: menos tokens de padding.
+            # La columna "length" solo la usa el sampler; el Trainer la descarta
+            # antes del collator (remove_unused_columns por defecto)
+            group_by_length=True,
+            length_column_name="length",
             # Optimizaciones específicas
-            gradient_accumulation_steps=2,  # Simula batch_size mayor
+            gradient_accumulation_steps=gradient_accumulation_steps,  # Simula batch_size mayor
             lr_scheduler_type="cosine",  # Mejor scheduler
         )
         
-        # Data collator
-        data_collator = DataCollatorForLanguageModeling(
+        # Data collator: los labels ya vienen armados (prompt enmascarado),
+        # solo se rellenan; DataCollatorForLanguageModeling los recalcularía
+        data_collator = DataCollatorForSeq2Seq(
             tokenizer=self.tokenizer,
-            mlm=False  # Causal LM, no masked LM
+            label_pad_token_id=-100,
+            pad_to_multiple_of=8  # Largos alineados a los tensor cores
         )
         
         # Crear Trainer
@@ -283,11 +500,20 @@ class MedicalGPT2Trainer:
             logger.info(f"   - Tiempo total: {train_result.metrics['train_runtime']:.2f} segundos")
             logger.info("=" * 80)
             
-            # Guardar modelo
-            logger.info(f"💾 Guardando modelo entrenado en: {self.config.output_dir}")
-            self.model.save_pretrained(self.config.output_dir)
-            self.tokenizer.save_pretrained(self.config.output_dir)
-            logger.info("✅ Modelo guardado exitosamente")
+            # Guardar modelo (con DDP, solo el proceso principal escribe)
+            if trainer.is_world_process_zero():
+                logger.info(f"💾 Guardando modelo entrenado en: {self.config.output_dir}")
+                if self._lora_enabled:
+                    # El adaptador solo (pocos MB) en un subdirectorio y el modelo
+                    # fusionado en output_dir, que la API carga como GPT-2 normal
+                    adapter_dir = os.path.join(self.config.output_dir, "lora_adapter")
+                    self.model.save_pretrained(adapter_dir)
+                    logger.info(f"🧩 Adaptador LoRA guardado en: {adapter_dir}")
+                    self.model.merge_and_unload().save_pretrained(self.config.output_dir)
+                else:
+                    self.model.save_pretrained(self.config.output_dir)
+                self.tokenizer.save_pretrained(self.config.output_dir)
+                logger.info("✅ Modelo guardado exitosamente")
             
             # Evaluar
             logger.info("🔍 Evaluando modelo...")
@@ -299,27 +525,39 @@ class MedicalGPT2Trainer:
             logger.info(f"   - Loss de evaluación: {eval_results['eval_loss']:.4f}")
             
             # Calcular perplexity
-            import math
             perplexity = math.exp(eval_results['eval_loss'])
             logger.info(f"   - Perplexity: {perplexity:.2f}")
             logger.info("=" * 80)
             
             # Guardar métricas
-            metrics_file = os.path.join(self.config.output_dir, "metrics.json")
-            with open(metrics_file, 'w') as f:
-                json.dump({
-                    "train_loss": train_result.training_loss,
-                    "eval_loss": eval_results['eval_loss'],
-                    "perplexity": perplexity,
-                    "train_runtime": train_result.metrics['train_runtime']
-                }, f, indent=2)
-            
-            logger.info(f"💾 Métricas guardadas en: {metrics_file}")
+            if trainer.is_world_process_zero():
+                metrics_file = os.path.join(self.config.output_dir, "metrics.json")
+                with open(metrics_file, 'w') as f:
+                    json.dump({
+                        "train_loss": train_result.training_loss,
+                        "eval_loss": eval_results['eval_loss'],
+                        "perplexity": perplexity,
+                        "train_runtime": train_result.metrics['train_runtime']
+                    }, f, indent=2)
+                
+                logger.info(f"💾 Métricas guardadas en: {metrics_file}")
             
         except Exception as e:
             logger.error(f"❌ Error durante el entrenamiento: {e}")
             raise
     
+    def _bitsandbytes_available(self) -> bool:
+        """Verifica si se puede usar el optimizador de 8 bits (CUDA + bitsandbytes instalado)."""
+        if self.device != "cuda":
+            logger.warning("⚠️  AdamW de 8 bits requiere CUDA; se usa AdamW estándar")
+            return False
+        try:
+            import bitsandbytes  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️  bitsandbytes no está instalado; se usa AdamW estándar")
+            return False
+        return True
+    
     def test_generation(self, test_prompts: Optional[List[str]] = None) -> None:
         """
         Prueba la generación de respuestas con el modelo entrenado.
@@ -341,55 +579,64 @@ class MedicalGPT2Trainer:
         
         self.model.eval()
         
-        for prompt in test_prompts:
-            logger.info(f"\n👤 Usuario: {prompt}")
+        # KV cache para decodificar: con gradient checkpointing quedó desactivado
+        # en la config y cada token nuevo recalcularía toda la secuencia
+        use_cache_entrenamiento = self.model.config.use_cache
+        self.model.config.use_cache = True
+        
+        # Todos los prompts en un solo batch (padding a la izquierda, como
+        # está configurado el tokenizer) y una sola llamada a generate
+        formatted_prompts = [f"Usuario: {prompt}\nAsistente:" for prompt in test_prompts]
+        use_bf16 = self.device == "cuda" and torch.cuda.is_bf16_supported()
+        
+        try:
+            inputs = self.tokenizer(
+                formatted_prompts,
+                return_tensors="pt",
+                padding=True,
+                return_attention_mask=True
+            ).to(self.device)
             
-            try:
-                # Formatear como en el entrenamiento
-                formatted_prompt = f"Usuario: {prompt}\nAsistente:"
-                
-                # Tokenizar
-                inputs = self.tokenizer(
-                    formatted_prompt,
-                    return_tensors="pt",
-                    padding=True,
-                    return_attention_mask=True
+            # Generar
+            with torch.inference_mode(), torch.autocast(
+                device_type=self.device, dtype=torch.bfloat16, enabled=use_bf16
+            ):
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=60,
+                    temperature=0.8,
+                    do_sample=True,
+                    top_p=0.92,
+                    top_k=50,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    eos_token_id=self.tokenizer.eos_token_id,
+                    no_repeat_ngram_size=3,
+                    repetition_penalty=1.3,
+                    num_return_sequences=1,
+                    use_cache=True
                 )
-                
-                input_ids = inputs["input_ids"].to(self.device)
-                attention_mask = inputs["attention_mask"].to(self.device)
-                
-                # Generar
-                with torch.no_grad():
-                    outputs = self.model.generate(
-                        input_ids,
-                        attention_mask=attention_mask,
-                        max_new_tokens=60,
-                        temperature=0.8,
-                        do_sample=True,
-                        top_p=0.92,
-                        top_k=50,
-                        pad_token_id=self.tokenizer.pad_token_id,
-                        eos_token_id=self.tokenizer.eos_token_id,
-                        no_repeat_ngram_size=3,
-                        repetition_penalty=1.3,
-                        num_return_sequences=1
-                    )
-                
-                # Decodificar solo los tokens nuevos
-                response = self.tokenizer.decode(
-                    outputs[0][input_ids.shape[1]:],
-                    skip_special_tokens=True
-                )
-                
-                # Limpiar respuesta
-                response = response.split("\n")[0].strip()  # Solo primera línea
-                
-                logger.info(f"🤖 Asistente: {response}")
-                
-            except Exception as e:
-                logger.error(f"❌ Error generando respuesta: {e}")
+            
+            # Decodificar solo los tokens nuevos
+            responses = self.tokenizer.batch_decode(
+                outputs[:, inputs["input_ids"].shape[1]:],
+                skip_special_tokens=True
+            )
+        except Exception as e:
+            logger.error(f"❌ Error generando respuestas: {e}")
+            responses = None
+        finally:
+            # Dejar la config como estaba por si se vuelve a entrenar
+            self.model.config.use_cache = use_cache_entrenamiento
+        
+        for i, prompt in enumerate(test_prompts):
+            logger.info(f"\n👤 Usuario: {prompt}")
+            if responses is None:
                 logger.info(f"🤖 Asistente: [Error en generación]")
+                continue
+            
+            # Limpiar respuesta
+            response = responses[i].split("\n")[0].strip()  # Solo primera línea
+            logger.info(f"🤖 Asistente: {response}")
         
         logger.info("\n" + "=" * 80)
 
@@ -407,9 +654,19 @@ def main():
     parser.add_argument("--max_length", type=int, default=256, help="Longitud máxima de secuencia")
     parser.add_argument("--model_name", type=str, default="DeepESP/gpt2-spanish", help="Modelo base")
     parser.add_argument("--output_dir", type=str, default="app/training/models/gpt2-spanish-medical", help="Directorio de salida")
+    parser.add_argument("--gradient_checkpointing", action="store_true", help="Ahorra memoria de activaciones (permite batch mayor)")
+    parser.add_argument("--optim_8bit", action="store_true", help="Usar AdamW de 8 bits (requiere bitsandbytes)")
+    parser.add_argument("--compile", action="store_true", help="Compilar el modelo con torch.compile (solo CUDA)")
+    parser.add_argument("--lora", action="store_true", help="Entrenar adaptadores LoRA en lugar del modelo completo (requiere peft)")
+    parser.add_argument("--lora_r", type=int, default=16, help="Rango de los adaptadores LoRA")
     
     args = parser.parse_args()
     
+    # Con torchrun hay un proceso por GPU: solo el rank 0 escribe logs informativos
+    is_main_process = int(os.environ.get("RANK", 0)) == 0
+    if not is_main_process:
+        logger.setLevel(logging.WARNING)
+    
     # Configuración
     config = TrainingConfig(
         model_name=args.model_name,
@@ -417,7 +674,13 @@ def main():
         num_epochs=args.epochs,
         batch_size=args.batch_size,
         learning_rate=args.learning_rate,
-        max_length=args.max_length
+        max_length=args.max_length,
+        gradient_checkpointing=args.gradient_checkpointing,
+        use_8bit_optim=args.optim_8bit,
+        torch_compile=args.compile,
+        use_lora=args.lora,
+        lora_r=args.lora_r,
+        lora_alpha=2 * args.lora_r
     )
     
     # Crear trainer
@@ -440,7 +703,8 @@ def main():
     trainer.train()
     
     # 5. Probar generación
-    trainer.test_generation()
+    if is_main_process:
+        trainer.test_generation()
     
     logger.info("")
     logger.info("=" * 80)
@@ -29,6 +29,22 @@ from transformers import (
 )
 from datasets import Dataset
 
+try:
+    # Parser JSON en C (ya usado por los generadores de datasets)
+    import orjson
+
+    def _load_json(path: str):
+        """Lee un archivo JSON con orjson."""
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+except ImportError:
+    import json
+
+    def _load_json(path: str):
+        """Lee un archivo JSON con la librería estándar."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -91,9 +107,7 @@ class StructuredMedicalGPT2Trainer:
         logger.info(f"📁 Archivo: {dataset_path}")
         
         # Cargar JSON
-        import json
-        with open(dataset_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _load_json(dataset_path)
         
         logger.info(f"✅ Cargados {len(data)} ejemplos estructurados")
         
@@ -9,7 +9,7 @@ Funciones de utilidad compartidas en toda la aplicación.
 
 import re
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 
 def validate_phone_number(phone: str) -> bool:
@@ -174,6 +174,26 @@ def calculate_confidence_score(keyword_matches: int, total_keywords: int) -> flo
     return min(keyword_matches / total_keywords, 1.0)
 
 
+# Meses en español indexados por número de mes (no depende del locale del proceso)
+MONTHS_ES = (
+    "", "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+    "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+)
+
+
+def format_date_spanish(dt: date) -> str:
+    """
+    Formatea una fecha en español sin pasar por strftime("%B").
+    
+    Args:
+        dt: date o datetime
+    
+    Returns:
+        String formateado (ej: "04 de octubre de 2025")
+    """
+    return f"{dt.day:02d} de {MONTHS_ES[dt.month]} de {dt.year}"
+
+
 def format_datetime_spanish(dt: datetime) -> str:
     """
     Formatea datetime en español para mensajes amigables.
@@ -184,11 +204,4 @@ def format_datetime_spanish(dt: datetime) -> str:
     Returns:
         String formateado (ej: "4 de octubre de 2025 a las 10:30")
     """
-    months = [
-        "enero", "febrero", "marzo", "abril", "mayo", "junio",
-        "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
-    ]
-    
-    month_name = months[dt.month - 1]
-    
-    return f"{dt.day} de {month_name} de {dt.year} a las {dt.hour:02d}:{dt.minute:02d}"
+    return f"{dt.day} de {MONTHS_ES[dt.month]} de {dt.year} a las {dt.hour:02d}:{dt.minute:02d}"
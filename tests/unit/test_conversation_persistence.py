@@ -0,0 +1,230 @@
+"""
+Unit Tests for Conversation Persistence
+========================================
+
+Tests unitarios para el flag de cambios pendientes (dirty) de Conversation,
+el guardado condicional de ConversationRepository y la escritura única por
+turno de ConversationService.
+"""
+
+import json
+import pytest
+from app.domain.models import (
+    Conversation,
+    ConversationState,
+    ConversationStatus,
+    MessageRole
+)
+from app.infrastructure.redis.conversation_repository import ConversationRepository
+from app.services.conversation_service import ConversationService
+
+
+class FakeRedisClient:
+    """
+    Cliente Redis en memoria con la misma interfaz que RedisClient.
+
+    Serializa a JSON igual que el cliente real y cuenta las escrituras.
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.set_calls = 0
+
+    def set(self, key, value, expire=None):
+        if not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        self.store[key] = value
+        self.set_calls += 1
+        return True
+
+    def get(self, key, as_json=True):
+        value = self.store.get(key)
+        if value is None:
+            return None
+        return json.loads(value) if as_json else value
+
+    def expire(self, key, seconds):
+        return key in self.store
+
+
+class CountingRepository(ConversationRepository):
+    """Repositorio sobre Redis en memoria que cuenta las llamadas a save()"""
+
+    def __init__(self):
+        super().__init__(FakeRedisClient())
+        self.save_calls = 0
+
+    def save(self, conversation, ttl=None):
+        self.save_calls += 1
+        return super().save(conversation, ttl)
+
+
+class FakeAIService:
+    """AIService sin modelo: sin acciones detectadas y respuesta fija"""
+
+    def __init__(self, extracted=None):
+        self.extracted = extracted or {"fecha": None, "hora": None, "motivo": None}
+
+    def detect_action(self, message, conversation):
+        return None
+
+    def _extract_appointment_data(self, message):
+        return dict(self.extracted)
+
+    async def generate_response(self, conversation, user_id, max_tokens=None, temperature=None):
+        return "Hola, ¿en qué puedo ayudarte?"
+
+
+@pytest.fixture
+def clean_conversation():
+    """Conversación sincronizada con el almacenamiento"""
+    conv = Conversation(conversation_id="test_conv_123", user_id="+59170123456")
+    conv.mark_clean()
+    return conv
+
+
+@pytest.fixture
+def fake_redis():
+    """Cliente Redis en memoria"""
+    return FakeRedisClient()
+
+
+@pytest.fixture
+def repo(fake_redis):
+    """Repositorio sobre el cliente Redis en memoria"""
+    return ConversationRepository(fake_redis)
+
+
+class TestConversationDirtyFlag:
+    """Tests para el flag de cambios pendientes de Conversation"""
+
+    def test_new_conversation_is_dirty(self):
+        """Una conversación nueva aún no está guardada"""
+        conv = Conversation(conversation_id="c1", user_id="+59170123456")
+        assert conv.is_dirty == True
+
+    def test_mark_clean(self, clean_conversation):
+        """mark_clean deja la conversación sin cambios pendientes"""
+        assert clean_conversation.is_dirty == False
+
+    def test_add_message_marks_dirty(self, clean_conversation):
+        """Añadir un mensaje marca la conversación como modificada"""
+        clean_conversation.add_message(MessageRole.USER, "Hola")
+        assert clean_conversation.is_dirty == True
+
+    def test_set_state_marks_dirty(self, clean_conversation):
+        """Cambiar el estado marca la conversación como modificada"""
+        clean_conversation.set_state(ConversationState.RESCHEDULE_WAITING_DATE, cita_id="1")
+        assert clean_conversation.is_dirty == True
+
+    def test_update_state_data_marks_dirty(self, clean_conversation):
+        """Actualizar state_data marca la conversación como modificada"""
+        clean_conversation.update_state_data(fecha="2025-10-20")
+        assert clean_conversation.is_dirty == True
+
+    def test_clear_state_marks_dirty(self, clean_conversation):
+        """Limpiar el estado marca la conversación como modificada"""
+        clean_conversation.clear_state()
+        assert clean_conversation.is_dirty == True
+
+    def test_close_marks_dirty(self, clean_conversation):
+        """Cerrar la conversación la marca como modificada"""
+        clean_conversation.close()
+        assert clean_conversation.is_dirty == True
+
+
+class TestConversationRepositorySave:
+    """Tests para el guardado condicional del repositorio"""
+
+    def test_save_clean_conversation_is_noop(self, repo, fake_redis, clean_conversation):
+        """Guardar una conversación sin cambios no escribe en Redis"""
+        assert repo.save(clean_conversation) == True
+        assert fake_redis.set_calls == 0
+        assert fake_redis.store == {}
+
+    def test_save_marks_conversation_clean(self, repo, clean_conversation):
+        """Después de guardar no quedan cambios pendientes"""
+        clean_conversation.add_message(MessageRole.USER, "Hola")
+        assert repo.save(clean_conversation) == True
+        assert clean_conversation.is_dirty == False
+
+    def test_save_after_mutation_round_trip(self, repo, fake_redis, clean_conversation):
+        """Una conversación modificada y guardada se recupera limpia y con los cambios"""
+        clean_conversation.add_message(MessageRole.USER, "Quiero reprogramar mi cita")
+        clean_conversation.set_state(ConversationState.RESCHEDULE_WAITING_TIME, cita_id="42")
+        clean_conversation.update_state_data(fecha="2025-10-20")
+        repo.save(clean_conversation)
+
+        loaded = repo.get("+59170123456")
+
+        assert loaded is not None
+        assert loaded.is_dirty == False
+        assert loaded.status == ConversationStatus.ACTIVE
+        assert loaded.state == ConversationState.RESCHEDULE_WAITING_TIME
+        assert loaded.state_data == {"cita_id": "42", "fecha": "2025-10-20"}
+        assert len(loaded.messages) == 1
+        assert loaded.messages[0].role == MessageRole.USER
+        assert loaded.messages[0].content == "Quiero reprogramar mi cita"
+
+        # Recién cargada: volver a guardarla no escribe nada
+        writes = fake_redis.set_calls
+        repo.save(loaded)
+        assert fake_redis.set_calls == writes
+
+
+class TestConversationServiceWrites:
+    """Tests para la cantidad de escrituras por turno de conversación"""
+
+    USER_ID = "+59170123456"
+
+    def _service(self, repo, ai_service=None):
+        return ConversationService(ai_service or FakeAIService(), repo, appointment_service=object())
+
+    @pytest.mark.asyncio
+    async def test_model_turn_saves_once(self):
+        """Un turno con respuesta del modelo guarda una sola vez"""
+        repo = CountingRepository()
+        conv = Conversation(conversation_id="c1", user_id=self.USER_ID)
+        repo.save(conv)
+        repo.save_calls = 0
+
+        await self._service(repo).process_user_message(self.USER_ID, "Hola")
+
+        assert repo.save_calls == 1
+        loaded = repo.get(self.USER_ID)
+        assert [m.role for m in loaded.messages] == [MessageRole.USER, MessageRole.ASSISTANT]
+
+    @pytest.mark.asyncio
+    async def test_first_turn_saves_once(self):
+        """La conversación nueva se guarda junto con el primer turno"""
+        repo = CountingRepository()
+
+        await self._service(repo).process_user_message(self.USER_ID, "Hola")
+
+        assert repo.save_calls == 1
+        assert len(repo.get(self.USER_ID).messages) == 2
+
+    @pytest.mark.asyncio
+    async def test_flow_turn_saves_messages_and_state_once(self):
+        """Un turno dentro del flujo guarda mensajes y estado en una escritura"""
+        repo = CountingRepository()
+        conv = Conversation(conversation_id="c1", user_id=self.USER_ID)
+        conv.set_state(ConversationState.RESCHEDULE_WAITING_DATE, cita_id="42")
+        repo.save(conv)
+        repo.save_calls = 0
+        ai_service = FakeAIService({
+            "fecha": "2099-01-05T00:00:00.000Z",
+            "hora": None,
+            "motivo": None
+        })
+
+        await self._service(repo, ai_service).process_user_message(self.USER_ID, "el lunes")
+
+        assert repo.save_calls == 1
+        loaded = repo.get(self.USER_ID)
+        assert loaded.state == ConversationState.RESCHEDULE_WAITING_TIME
+        assert loaded.state_data["fecha"] == "2099-01-05T00:00:00.000Z"
+        assert [m.role for m in loaded.messages] == [MessageRole.USER, MessageRole.ASSISTANT]
+
+
+# Para ejecutar: pytest tests/unit/test_conversation_persistence.py -v
@@ -6,12 +6,15 @@ Tests unitarios para las funciones de validación.
 """
 
 import pytest
+from datetime import datetime
 from app.utils.validators import (
     validate_phone_number,
     format_phone_number,
     extract_last_four_digits,
     truncate_text,
-    sanitize_input
+    sanitize_input,
+    format_date_spanish,
+    format_datetime_spanish
 )
 
 
@@ -69,4 +72,17 @@ class TestTextUtils:
         assert sanitize_input(text) == "Hola mundo"
 
 
+class TestDateFormatting:
+    """Tests para formateo de fechas en español"""
+    
+    def test_format_date_spanish(self):
+        """Nombre del mes sin depender del locale, con el día en dos dígitos"""
+        assert format_date_spanish(datetime(2025, 11, 4)) == "04 de noviembre de 2025"
+    
+    def test_format_datetime_spanish(self):
+        """Fecha con hora en formato HH:MM"""
+        dt = datetime(2025, 1, 15, 9, 5)
+        assert format_datetime_spanish(dt) == "15 de enero de 2025 a las 09:05"
+
+
 # Para ejecutar: pytest tests/unit/test_validators.py -v